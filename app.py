@@ -1,23 +1,41 @@
-import io
-import pandas as pd
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, Response
+from flask import Flask, render_template, request, redirect, url_for, flash, Response, stream_with_context, jsonify
 import crawler_logic as crawler
+import exporter
+import metrics
+from job_store import JobStore
+from task_queue import TaskQueue
+from event_hub import EventHub, sse_frames
 import threading
-from queue import Queue
-import time
+import multiprocessing
+import json
+import hmac
+from functools import wraps
 
 # --- CẤU HÌNH FLASK ---
 app = Flask(__name__)
 app.secret_key = 'a_very_secret_key_for_flash_messages'
 
 # --- QUẢN LÝ TRẠNG THÁI NÂNG CAO ---
-# Sử dụng Queue để giao tiếp an toàn giữa các luồng (thread-safe)
-# Luồng worker sẽ đặt (put) log vào queue, luồng SSE sẽ lấy (get) log ra
-LOG_QUEUE = Queue()
-# Dict để lưu kết quả cuối cùng
-APP_STATE = {"rows_data": []}
+# Mỗi job có một kênh sự kiện riêng (log, tiến độ, cập nhật dòng); trang log đọc kênh của job qua SSE
+EVENTS = EventHub()
+# Job và các dòng kết quả được lưu trong SQLite
+STORE = JobStore()
+# Hàng đợi việc cho worker phân tán (worker.py)
+QUEUE = TaskQueue()
+# Job harvest đang được xem/xử lý (đặt trong startup())
+APP_STATE = {"job_id": None}
+
+def startup():
+    """Khôi phục sau khi app khởi động lại: job còn 'running' là job bị gián đoạn, trừ job còn việc trong hàng đợi phân tán."""
+    for job_id in STORE.interrupt_running():
+        if QUEUE.outstanding(job_id): STORE.set_job_status(job_id, "running")
+    APP_STATE["job_id"] = STORE.latest_job("harvest")
+
+# Chạy khi import (cả `python app.py`, `flask run` lẫn WSGI), trừ trong tiến trình harvest: tiến trình con (spawn)
+# import lại app.py dưới tên __mp_main__ và không được đụng tới job đang chạy ở tiến trình cha.
+if multiprocessing.parent_process() is None: startup()
 
 # --- CÁC ROUTE CỦA WEB APP ---
 
@@ -45,84 +63,328 @@ def save_config():
     cfg['selenium_wait_body'] = int(request.form.get('selenium_wait_body', 5))
     cfg['selenium_wait_click'] = int(request.form.get('selenium_wait_click', 2))
     cfg['selenium_sleep_per_page'] = float(request.form.get('selenium_sleep_per_page', 0.5))
+    cfg['http_max_total'] = int(request.form.get('http_max_total', 16))
+    cfg['http_max_per_host'] = int(request.form.get('http_max_per_host', 2))
+    cfg['http_host_delay'] = float(request.form.get('http_host_delay', 1.0))
+    cfg['http_retries'] = int(request.form.get('http_retries', 2))
+    cfg['respect_robots'] = 'respect_robots' in request.form
+    cfg['smart_escalation'] = 'smart_escalation' in request.form
+    cfg['selenium_block_resources'] = 'selenium_block_resources' in request.form
+    cfg['driver_max_uses'] = int(request.form.get('driver_max_uses', 40))
+    cfg['cache_ttl_hours'] = float(request.form.get('cache_ttl_hours', 720))
+    cfg['cache_negative_ttl_hours'] = float(request.form.get('cache_negative_ttl_hours', 72))
+    cfg['harvest_workers'] = int(request.form.get('harvest_workers', 3))
+    cfg['harvest_retries'] = int(request.form.get('harvest_retries', 1))
+    cfg['harvest_min_interval'] = float(request.form.get('harvest_min_interval', 2.0))
+    cfg['distributed_mode'] = 'distributed_mode' in request.form
+    cfg['worker_token'] = request.form.get('worker_token', '').strip()
+    cfg['lease_seconds'] = int(request.form.get('lease_seconds', 300))
+    cfg['task_max_attempts'] = int(request.form.get('task_max_attempts', 3))
+    # API worker mở trên 0.0.0.0: không cho chạy phân tán khi chưa có token
+    refused = cfg['distributed_mode'] and not cfg['worker_token']
+    if refused: cfg['distributed_mode'] = False
     crawler.ConfigManager.save(cfg)
-    flash("Đã lưu cấu hình thành công!")
+    flash("Đã lưu cấu hình, nhưng chưa bật chế độ phân tán: cần đặt token cho worker." if refused else "Đã lưu cấu hình thành công!")
     return redirect(url_for('config_page'))
 
 # --- CÁC HÀM WORKER CHẠY NỀN ---
 
-def harvest_worker(main_kw, sub_kws):
+def query_key(main_kw, sub_kw) -> str:
+    return json.dumps([main_kw, sub_kw], ensure_ascii=False)
+
+def url_for_results(dataset_id) -> str:
+    # Worker chạy ngoài request context nên không dùng url_for
+    return f"/results?job={dataset_id}"
+
+def start_worker(target, *args):
+    thread = threading.Thread(target=with_job_metrics(target), args=args)
+    thread.daemon = True
+    thread.start()
+
+def with_job_metrics(target):
+    """Chạy worker (job_id là tham số đầu) với một registry số liệu riêng của job, lưu tóm tắt vào job khi xong."""
+    def run(job_id, *args):
+        job_metrics = metrics.Registry()
+        with metrics.bind(job_metrics):
+            try: return target(job_id, *args)
+            finally:
+                job = STORE.get_job(job_id)
+                summary = dict((job or {}).get("summary") or {}, metrics=job_metrics.summary())
+                STORE.set_job_status(job_id, job["status"] if job else "error", summary)
+    return run
+
+def harvest_worker(job_id, queries):
     """Hàm này sẽ chạy trong một luồng riêng để không làm treo web."""
     cfg = crawler.ConfigManager.load()
-    queries = [(main_kw, sk) for sk in sub_kws] if sub_kws else [(main_kw, None)]
-    all_rows = []
-    
-    # Hàm callback để đặt log vào Queue
-    def log_callback(msg):
-        LOG_QUEUE.put(msg)
-
-    with ThreadPoolExecutor(max_workers=min(3, len(queries))) as executor:
-        futs = {executor.submit(crawler.harvest_one_query, q[0], q[1], cfg['headless'], cfg['max_scroll'], cfg['delay'], log_callback): q for q in queries}
-        for future in as_completed(futs):
-            try: all_rows.extend(future.result())
-            except Exception as e: log_callback(f"Lỗi thread harvest {futs[future]}: {e}")
-
-    seen = set()
-    APP_STATE["rows_data"] = [row for row in all_rows if (row.get("Tên"), row.get("Trang web")) not in seen and not seen.add((row.get("Tên"), row.get("Trang web")))]
-    # Gửi tín hiệu đặc biệt để báo cho client biết tác vụ đã hoàn thành
-    LOG_QUEUE.put("---TASK_COMPLETE---")
-
-def get_emails_worker(indices_to_process):
-    """Hàm chạy nền để lấy email."""
+    # Các dòng được ghi vào job ngay khi trích xuất được, đã loại trùng (kể cả với dòng của lần chạy trước khi resume)
+    seen, rows_lock = {crawler.row_key(r) for r in STORE.get_rows(job_id)}, threading.Lock()
+
+    channel = EVENTS.channel(job_id)
+    total, done = len(queries), [0]
+    log_callback = channel.log
+
+    def on_row(row):
+        key = crawler.row_key(row)
+        with rows_lock:
+            if key in seen: return
+            seen.add(key)
+        idx = STORE.add_row(job_id, row)
+        channel.publish("row", idx=idx, name=row.get("Tên"), website=row.get("Trang web"))
+
+    def on_query_done(query, ok):
+        STORE.set_task(job_id, query_key(*query), "done" if ok else "error")
+        done[0] += 1
+        channel.publish("progress", done=done[0], total=total, rows=len(seen))
+
+    status = "done"
+    try: crawler.harvest_parallel(queries, cfg, log_callback, on_row, on_query_done)
+    except Exception as e:
+        status = "error"; log_callback(f"Lỗi harvest: {e}")
+    if STORE.unfinished_tasks(job_id): status = "error"
+    STORE.set_job_status(job_id, status, {"rows": STORE.count_rows(job_id), "tasks": STORE.task_counts(job_id)})
+
+    # Báo cho client biết tác vụ đã hoàn thành
+    channel.close(status=status, results=url_for_results(job_id))
+
+def get_emails_worker(job_id, dataset_id, indices_to_process):
+    """Hàm chạy nền để lấy email cho các dòng của job harvest dataset_id; mỗi dòng xong được ghi ngay."""
     cfg = crawler.ConfigManager.load()
-    rows_data = APP_STATE["rows_data"]
-    domain_cache = {}
+    domain_cache = crawler.DomainCache(ttl_hours=cfg['cache_ttl_hours'], negative_ttl_hours=cfg['cache_negative_ttl_hours'])
+    crawler.HTTP.configure(cfg['http_max_total'], cfg['http_max_per_host'], cfg['http_host_delay'], cfg['http_retries'], cfg['respect_robots'])
 
-    def log_callback(msg):
-        LOG_QUEUE.put(msg)
+    channel = EVENTS.channel(job_id)
+    total, done = len(indices_to_process), 0
+    log_callback = channel.log
 
-    def process_one_site(original_index):
-        # ... (Toàn bộ logic xử lý một site được giữ nguyên)
-        row_data = rows_data[original_index].copy()
+    def process_one_site(original_index, row_data):
         url = crawler.normalize_url(row_data.get("Trang web", ""))
         if not url:
             row_data['Trạng thái'] = "Không có trang web"
             return original_index, row_data
-        domain = crawler.canonical_domain(url)
-        if domain in domain_cache:
-            cached = domain_cache[domain]
-            row_data['Email'] = "; ".join(cached.get("emails", []))
-            row_data['Trạng thái'] = f"Từ cache ({cached.get('source', 'NA')})"
-            return original_index, row_data
-
-        emails, source = crawler.request_phase_contact_only(url, cfg['contact_hints'], cfg['blocklist'], log_callback)
-        if not emails:
-            driver = None
-            try:
-                driver = crawler.build_driver(headless=cfg['headless'])
-                emails, source = crawler.selenium_phase_contact_then_home(driver, url, cfg['contact_hints'], cfg['blocklist'], log_callback)
-            finally:
-                if driver: driver.quit()
-        if emails:
-            row_data['Email'] = "; ".join(emails)
-            row_data['Trạng thái'] = f"OK - {source}"
-            domain_cache[domain] = {"emails": emails, "source": source}
-        else:
-            row_data['Trạng thái'] = "Không tìm thấy email"
+        row_data.update(crawler.crawl_site_emails(url, cfg, domain_cache, pool, log_callback))
         return original_index, row_data
 
-    with ThreadPoolExecutor(max_workers=cfg['selenium_workers']) as executor:
-        f_to_idx = {executor.submit(process_one_site, i): i for i in indices_to_process}
-        for future in as_completed(f_to_idx):
-            try:
-                idx, updated_row = future.result()
-                rows_data[idx] = updated_row
-            except Exception as e:
-                idx = f_to_idx[future]
-                rows_data[idx]['Trạng thái'] = f"Lỗi: {e}"
-    
-    APP_STATE["rows_data"] = rows_data
-    LOG_QUEUE.put("---TASK_COMPLETE---")
+    # Chrome chỉ được mở khi có site đầu tiên cần Selenium (nhiều site lấy được email ngay ở pha request)
+    pool = crawler.DriverPool(cfg['selenium_workers'], headless=cfg['headless'], max_uses=cfg['driver_max_uses'], log_callback=log_callback,
+                              block_resources=cfg['selenium_block_resources'])
+    status = "done"
+    try:
+        # Số site chạy song song theo request_workers (pha request là chính); DriverPool tự giới hạn số Chrome
+        with ThreadPoolExecutor(max_workers=max(cfg['request_workers'], cfg['selenium_workers'])) as executor:
+            # Mỗi dòng chỉ đọc một lần; xếp xen kẽ theo domain để các site cùng máy chủ không chạy dồn một lúc
+            rows = {i: STORE.get_row(dataset_id, i) for i in indices_to_process}
+            order = crawler.HttpEngine.order_by_host(list(rows), lambda i: crawler.normalize_url(rows[i].get("Trang web", "")))
+            task = metrics.propagate(process_one_site)
+            f_to_idx = {executor.submit(task, i, rows.pop(i)): i for i in order}
+            for future in as_completed(f_to_idx):
+                try:
+                    idx, updated_row = future.result()
+                    STORE.update_row(dataset_id, idx, updated_row)
+                    STORE.set_task(job_id, str(idx), "done")
+                except Exception as e:
+                    idx = f_to_idx[future]
+                    updated_row = STORE.get_row(dataset_id, idx)
+                    updated_row['Trạng thái'] = f"Lỗi: {e}"
+                    STORE.update_row(dataset_id, idx, updated_row)
+                    STORE.set_task(job_id, str(idx), "error", str(e))
+                done += 1
+                channel.publish("row", idx=idx, email=updated_row.get("Email", ""), status=updated_row.get("Trạng thái", ""), selenium=updated_row.get("Selenium", ""))
+                channel.publish("progress", done=done, total=total)
+    except Exception as e:
+        status = "error"; log_callback(f"Lỗi lấy email: {e}")
+    finally:
+        pool.close()
+        domain_cache.close()
+
+    STORE.set_job_status(job_id, status, {"tasks": STORE.task_counts(job_id)})
+    channel.close(status=status, results=url_for_results(dataset_id))
+
+
+# --- CHẾ ĐỘ WORKER PHÂN TÁN ---
+# Khi bật distributed_mode, app không tự chạy worker mà đưa việc vào QUEUE: mỗi truy vấn Maps là một việc
+# 'harvest', mỗi domain (gồm mọi dòng có cùng domain) là một việc 'email'. worker.py trên các máy khác lấy
+# việc qua /api/worker/*, gửi log/dòng/kết quả về; app ghi vào STORE và kênh sự kiện như worker nội bộ.
+# Kết quả được ghi idempotent (loại trùng dòng theo row_key, cập nhật dòng theo idx) vì việc có thể chạy lại.
+
+DIST_LOCK = threading.Lock()
+DIST_SEEN = {}     # job harvest -> tập row_key đã ghi
+DIST_METRICS = {}  # job -> Registry gộp số liệu worker gửi về
+
+def enqueue_harvest(job_id, queries):
+    cfg = crawler.ConfigManager.load()
+    QUEUE.put_many(job_id, "harvest", [(query_key(mk, sk), {"main_kw": mk, "sub_kw": sk}) for mk, sk in queries], cfg['task_max_attempts'])
+    EVENTS.channel(job_id).log(f"📥 Đã đưa {len(queries)} truy vấn vào hàng đợi, chờ worker nhận việc...")
+
+def enqueue_emails(job_id, dataset_id, indices):
+    cfg = crawler.ConfigManager.load()
+    channel, groups = EVENTS.channel(job_id), {}
+    for idx in indices:
+        row = STORE.get_row(dataset_id, idx)
+        url = crawler.normalize_url(row.get("Trang web", ""))
+        if not url:
+            row['Trạng thái'] = "Không có trang web"
+            STORE.update_row(dataset_id, idx, row); STORE.set_task(job_id, str(idx), "done")
+            continue
+        groups.setdefault(crawler.canonical_domain(url), []).append([idx, url])
+    QUEUE.put_many(job_id, "email", [(f"domain:{d}", {"dataset_id": dataset_id, "sites": sites}) for d, sites in groups.items()],
+                   cfg['task_max_attempts'])
+    channel.log(f"📥 Đã đưa {len(groups)} domain ({sum(map(len, groups.values()))} dòng) vào hàng đợi, chờ worker nhận việc...")
+    finish_if_drained(job_id)
+
+def publish_progress(job_id):
+    counts = STORE.task_counts(job_id)
+    extra = {"rows": STORE.count_rows(job_id)} if STORE.get_job(job_id)["kind"] == "harvest" else {}
+    EVENTS.channel(job_id).publish("progress", done=counts.get("done", 0) + counts.get("error", 0), total=sum(counts.values()), **extra)
+
+def finish_if_drained(job_id):
+    """Khi job không còn việc chờ/chạy trong hàng đợi: chốt trạng thái, lưu tóm tắt và đóng kênh sự kiện."""
+    if QUEUE.outstanding(job_id): return
+    job = STORE.get_job(job_id)
+    if not job or job["status"] != "running": return
+    status = "error" if STORE.unfinished_tasks(job_id) else "done"
+    with DIST_LOCK:
+        DIST_SEEN.pop(job_id, None)
+        reg = DIST_METRICS.pop(job_id, None)
+    summary = {"tasks": STORE.task_counts(job_id), "queue": QUEUE.counts(job_id)}
+    if job["kind"] == "harvest": summary["rows"] = STORE.count_rows(job_id)
+    if reg is not None: summary["metrics"] = reg.summary()
+    STORE.set_job_status(job_id, status, summary)
+    EVENTS.channel(job_id).close(status=status, results=url_for_results(job["parent_id"] or job_id))
+
+def dist_add_rows(job_id, rows):
+    with DIST_LOCK:
+        seen = DIST_SEEN.get(job_id)
+        if seen is None: seen = DIST_SEEN[job_id] = {crawler.row_key(r) for r in STORE.get_rows(job_id)}
+        new = []
+        for row in rows:
+            key = crawler.row_key(row)
+            if key in seen: continue
+            seen.add(key); new.append(row)
+    channel = EVENTS.channel(job_id)
+    for row in new:
+        idx = STORE.add_row(job_id, row)
+        channel.publish("row", idx=idx, name=row.get("Tên"), website=row.get("Trang web"))
+
+def dist_apply_email_updates(job_id, dataset_id, updates: dict):
+    channel = EVENTS.channel(job_id)
+    for idx, cols in updates.items():
+        row = STORE.get_row(dataset_id, int(idx))
+        if row is None: continue
+        row.update(cols)
+        STORE.update_row(dataset_id, int(idx), row)
+        STORE.set_task(job_id, str(idx), "done")
+        channel.publish("row", idx=int(idx), email=row.get("Email", ""), status=row.get("Trạng thái", ""))
+
+def dist_mark_failed(job_id, key, payload, error):
+    """Việc hết lượt thử: đánh dấu lỗi các điểm kiểm tra tương ứng để 'Chạy tiếp' có thể đưa lại vào hàng đợi."""
+    if payload.get("sites") is not None:
+        for idx, _ in payload["sites"]:
+            row = STORE.get_row(payload["dataset_id"], idx)
+            row['Trạng thái'] = f"Lỗi: {error}"
+            STORE.update_row(payload["dataset_id"], idx, row)
+            STORE.set_task(job_id, str(idx), "error", error)
+    else:
+        STORE.set_task(job_id, key, "error", error)
+    EVENTS.channel(job_id).log(f"❌ Việc {key} thất bại sau nhiều lần thử: {error}")
+
+def dist_merge_metrics(job_id, snap):
+    if not snap: return
+    metrics.REGISTRY.merge(snap)
+    with DIST_LOCK: reg = DIST_METRICS.setdefault(job_id, metrics.Registry())
+    reg.merge(snap)
+
+def expire_dist_leases():
+    for job_id, key, payload in QUEUE.expire_leases():
+        dist_mark_failed(job_id, key, payload, "worker không phản hồi (hết hạn lease)")
+        publish_progress(job_id); finish_if_drained(job_id)
+
+def distributed_enabled() -> bool:
+    """Chế độ phân tán chỉ có hiệu lực khi đã đặt worker_token (config.json sửa tay cũng vậy)."""
+    cfg = crawler.ConfigManager.load()
+    return bool(cfg['distributed_mode'] and cfg['worker_token'])
+
+def worker_api(view):
+    """API cho worker: bắt buộc header X-Worker-Token khớp worker_token; chưa đặt token thì API bị tắt."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = crawler.ConfigManager.load().get('worker_token')
+        if not token: return jsonify(error="chưa cấu hình worker_token"), 403
+        if not hmac.compare_digest(request.headers.get('X-Worker-Token', ''), token): return jsonify(error="sai token"), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def leased_task(task_id, data):
+    """(job_id, key) nếu token của worker còn giữ lease; đồng thời đẩy log worker gửi kèm vào kênh của job."""
+    owner = QUEUE.owner_of(task_id, data.get('token'))
+    if owner:
+        channel = EVENTS.channel(owner[0])
+        for msg in data.get('logs') or []: channel.log(f"[{data.get('worker', 'worker')}] {msg}")
+    return owner
+
+@app.route('/api/worker/lease', methods=['POST'])
+@worker_api
+def api_worker_lease():
+    data = request.get_json(force=True)
+    cfg = crawler.ConfigManager.load()
+    expire_dist_leases()
+    tasks = QUEUE.lease(data.get('worker', '?'), data.get('kinds') or ["harvest", "email"], int(data.get('n', 1)), cfg['lease_seconds'])
+    for t in tasks:
+        EVENTS.channel(t["job_id"]).log(f"🛰️ Worker {data.get('worker', '?')} nhận việc {t['key']} (lần {t['attempt']})")
+    worker_cfg = {k: v for k, v in cfg.items() if k != 'worker_token'}
+    return jsonify(tasks=tasks, config=worker_cfg, lease_seconds=cfg['lease_seconds'])
+
+@app.route('/api/worker/tasks/<int:task_id>/heartbeat', methods=['POST'])
+@worker_api
+def api_worker_heartbeat(task_id):
+    data = request.get_json(force=True)
+    if not leased_task(task_id, data): return jsonify(error="mất lease"), 409
+    QUEUE.heartbeat(task_id, data['token'], crawler.ConfigManager.load()['lease_seconds'])
+    return jsonify(ok=True)
+
+@app.route('/api/worker/tasks/<int:task_id>/rows', methods=['POST'])
+@worker_api
+def api_worker_rows(task_id):
+    """Dòng harvest gửi dần trong lúc worker còn đang cuộn."""
+    data = request.get_json(force=True)
+    owner = leased_task(task_id, data)
+    if not owner: return jsonify(error="mất lease"), 409
+    dist_add_rows(owner[0], data.get('rows') or [])
+    publish_progress(owner[0])
+    return jsonify(ok=True)
+
+@app.route('/api/worker/tasks/<int:task_id>/complete', methods=['POST'])
+@worker_api
+def api_worker_complete(task_id):
+    data = request.get_json(force=True)
+    owner = leased_task(task_id, data)
+    if not owner: return jsonify(error="mất lease"), 409
+    job_id, key = owner
+    job = STORE.get_job(job_id)
+    # Ghi kết quả trước rồi mới đánh dấu xong: app chết giữa chừng thì việc được giao lại (ít nhất một lần)
+    if job["kind"] == "harvest":
+        dist_add_rows(job_id, data.get('rows') or [])
+        STORE.set_task(job_id, key, "done")
+    else:
+        dist_apply_email_updates(job_id, job["parent_id"], data.get('updates') or {})
+    dist_merge_metrics(job_id, data.get('metrics'))
+    QUEUE.complete(task_id, data['token'])
+    publish_progress(job_id); finish_if_drained(job_id)
+    return jsonify(ok=True)
+
+@app.route('/api/worker/tasks/<int:task_id>/fail', methods=['POST'])
+@worker_api
+def api_worker_fail(task_id):
+    data = request.get_json(force=True)
+    if not leased_task(task_id, data): return jsonify(error="mất lease"), 409
+    error = str(data.get('error') or "lỗi không rõ")
+    res = QUEUE.fail(task_id, data['token'], error, retry=bool(data.get('retry', True)))
+    if res is None: return jsonify(error="mất lease"), 409
+    job_id, key, payload, state = res
+    dist_merge_metrics(job_id, data.get('metrics'))
+    if state == "failed": dist_mark_failed(job_id, key, payload, error)
+    else: EVENTS.channel(job_id).log(f"⚠️ Việc {key} lỗi, sẽ thử lại: {error}")
+    publish_progress(job_id); finish_if_drained(job_id)
+    return jsonify(ok=True, state=state)
 
 
 # --- CÁC ROUTE KÍCH HOẠT TÁC VỤ ---
@@ -132,73 +394,134 @@ def start_harvest_task():
     """Kích hoạt tác vụ harvest và chuyển hướng đến trang xem log."""
     main_kw = request.form['main_kw']
     sub_kws = [kw.strip() for kw in request.form['sub_kws'].splitlines() if kw.strip()]
-    
+    queries = [(main_kw, sk) for sk in sub_kws] if sub_kws else [(main_kw, None)]
+
+    job_id = STORE.create_job("harvest", {"main_kw": main_kw, "sub_kws": sub_kws})
+    STORE.add_tasks(job_id, [query_key(*q) for q in queries])
+    APP_STATE["job_id"] = job_id
+    EVENTS.open(job_id)
+    if distributed_enabled(): enqueue_harvest(job_id, queries)
     # Chạy hàm worker trong một luồng nền
-    thread = threading.Thread(target=harvest_worker, args=(main_kw, sub_kws))
-    thread.daemon = True
-    thread.start()
-    
-    return redirect(url_for('log_viewer'))
+    else: start_worker(harvest_worker, job_id, queries)
+    return redirect(url_for('log_viewer', job=job_id))
 
 @app.route('/get-emails', methods=['POST'])
 def start_get_emails_task():
     """Kích hoạt tác vụ lấy email và chuyển hướng đến trang xem log."""
+    dataset_id = request.form.get('job_id') or APP_STATE["job_id"]
     selected_indices = [int(i) for i in request.form.getlist('selected_indices')]
-    if not selected_indices:
+    if not selected_indices or not dataset_id:
         flash("Bạn chưa chọn mục nào để lấy email!")
-        return redirect(url_for('show_results'))
+        return redirect(url_for('show_results', job=dataset_id))
 
-    thread = threading.Thread(target=get_emails_worker, args=(selected_indices,))
-    thread.daemon = True
-    thread.start()
-    
-    return redirect(url_for('log_viewer'))
+    job_id = STORE.create_job("emails", {"count": len(selected_indices)}, parent_id=dataset_id)
+    STORE.add_tasks(job_id, [str(i) for i in selected_indices])
+    APP_STATE["job_id"] = dataset_id
+    EVENTS.open(job_id)
+    if distributed_enabled(): enqueue_emails(job_id, dataset_id, selected_indices)
+    else: start_worker(get_emails_worker, job_id, dataset_id, selected_indices)
+    return redirect(url_for('log_viewer', job=job_id))
+
+@app.route('/jobs')
+def list_jobs():
+    """Danh sách job, kèm tiến độ từng job và nút chạy tiếp cho job bị gián đoạn."""
+    expire_dist_leases()
+    jobs = STORE.list_jobs()
+    for job in jobs:
+        job["created"] = datetime.fromtimestamp(job["created_at"]).strftime('%Y-%m-%d %H:%M')
+        job["tasks"] = STORE.task_counts(job["id"])
+        job["rows"] = STORE.count_rows(job["id"]) if job["kind"] == "harvest" else None
+    return render_template('jobs.html', jobs=jobs, workers=QUEUE.workers())
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Chạy lại chỉ những truy vấn/dòng chưa xong của một job."""
+    job = STORE.get_job(job_id)
+    if not job: return "Không tìm thấy job!", 404
+    if job["status"] == "running":
+        flash("Job này đang chạy.")
+        return redirect(url_for('list_jobs'))
+    pending = STORE.unfinished_tasks(job_id)
+    if not pending:
+        flash("Job này không còn việc nào chưa xong.")
+        return redirect(url_for('list_jobs'))
+
+    STORE.set_job_status(job_id, "running")
+    EVENTS.open(job_id)
+    distributed = distributed_enabled()
+    if job["kind"] == "harvest":
+        APP_STATE["job_id"] = job_id
+        queries = [tuple(json.loads(k)) for k in pending]
+        if distributed: enqueue_harvest(job_id, queries)
+        else: start_worker(harvest_worker, job_id, queries)
+    else:
+        APP_STATE["job_id"] = job["parent_id"]
+        if distributed: enqueue_emails(job_id, job["parent_id"], [int(k) for k in pending])
+        else: start_worker(get_emails_worker, job_id, job["parent_id"], [int(k) for k in pending])
+    return redirect(url_for('log_viewer', job=job_id))
 
 
 # --- CÁC ROUTE ĐẶC BIỆT CHO REAL-TIME ---
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Số liệu của tiến trình theo định dạng text của Prometheus."""
+    return Response(metrics.REGISTRY.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/jobs/<job_id>/metrics')
+def job_metrics(job_id):
+    """Tóm tắt số liệu của một job (thời gian từng giai đoạn, counter, domain chậm nhất) dạng JSON."""
+    job = STORE.get_job(job_id)
+    if not job: return "Không tìm thấy job!", 404
+    return Response(json.dumps((job["summary"] or {}).get("metrics") or {}, ensure_ascii=False, indent=2), mimetype='application/json')
+
 @app.route('/log-viewer')
 def log_viewer():
-    """Hiển thị trang xem log."""
-    return render_template('log_viewer.html')
+    """Hiển thị trang xem log của một job."""
+    job_id = request.args.get('job')
+    if not job_id: return redirect(url_for('list_jobs'))
+    return render_template('log_viewer.html', job_id=job_id)
 
 @app.route('/stream-logs')
 def stream_logs():
-    """Đây là trái tim của SSE. Nó sẽ gửi log từ Queue ra trình duyệt."""
-    def generate():
-        while True:
-            # Lấy một item từ queue. Nếu queue rỗng, nó sẽ đợi.
-            msg = LOG_QUEUE.get()
-            # Dữ liệu SSE phải có định dạng "data: ...\n\n"
-            yield f"data: {msg}\n\n"
-            if msg == "---TASK_COMPLETE---":
-                break
-            time.sleep(0.1) # Thêm một chút delay để tránh quá tải
-    return Response(generate(), mimetype='text/event-stream')
+    """SSE theo job: mỗi khung là một mảng JSON sự kiện đã gộp; hỗ trợ nhiều tab và đọc tiếp khi kết nối lại."""
+    job_id = request.args.get('job', '')
+    channel = EVENTS.get(job_id)
+    if channel is None:
+        # Job không chạy trong tiến trình này (đã xong từ trước khi khởi động lại): báo xong ngay
+        job = STORE.get_job(job_id)
+        if not job: return "Không tìm thấy job!", 404
+        channel = EVENTS.channel(job_id)
+        if not channel.last_seq and job["status"] != "running":
+            channel.close(status=job["status"], results=url_for_results(job["parent_id"] or job_id))
+    last_seq = channel.resume_seq(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    return Response(sse_frames(channel, last_seq), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 # --- CÁC ROUTE HIỂN THỊ KẾT QUẢ VÀ EXPORT ---
 
 @app.route('/results')
 def show_results():
-    """Hiển thị trang kết quả cuối cùng."""
-    return render_template('results.html', businesses=APP_STATE.get("rows_data", []))
+    """Hiển thị trang kết quả của một job harvest (mặc định: job hiện tại)."""
+    job_id = request.args.get('job') or APP_STATE["job_id"]
+    businesses = STORE.get_rows(job_id) if job_id else []
+    return render_template('results.html', businesses=businesses, job_id=job_id)
 
 @app.route('/export')
 def export_results():
-    # ... (Hàm này giữ nguyên như cũ)
-    if not APP_STATE.get("rows_data"): return "Không có dữ liệu để xuất!", 404
-    try:
-        df = pd.DataFrame(APP_STATE["rows_data"])
-        cols = ["Từ khóa", "Tên", "Địa chỉ", "Trang web", "Email", "Trạng thái"]
-        df = df[[c for c in cols if c in df.columns]]
-        output = io.BytesIO()
-        df.to_excel(output, index=False, sheet_name='Sheet1')
-        output.seek(0)
-        filename = f"ketqua_email_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-        return send_file(output, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=filename)
-    except Exception as e:
-        return f"Lỗi khi xuất file: {e}", 500
+    """Xuất kết quả theo luồng. Tham số: format=xlsx|csv|jsonl|parquet, cols=Tên,Email,..., status=..., kw=..."""
+    job_id = request.args.get('job') or APP_STATE["job_id"]
+    if not job_id or not STORE.count_rows(job_id): return "Không có dữ liệu để xuất!", 404
+    fmt = request.args.get('format', 'xlsx').lower()
+    if fmt not in exporter.FORMATS: return f"Định dạng không hỗ trợ: {fmt}", 400
+    if fmt == "parquet" and not exporter.parquet_available(): return "Cần cài pyarrow để xuất Parquet!", 400
+    cols = exporter.select_columns(request.args.get('cols', '').split(','))
+    rows = exporter.filter_rows((row for _, row in STORE.iter_rows(job_id)), request.args.get('status'), request.args.get('kw'))
+    mimetype, ext = exporter.FORMATS[fmt]
+    filename = f"ketqua_email_{datetime.now().strftime('%Y%m%d_%H%M')}.{ext}"
+    return Response(stream_with_context(exporter.export_stream(fmt, rows, cols)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
 if __name__ == '__main__':
     print("Khởi động ứng dụng web...")
@@ -0,0 +1,337 @@
+# benchmark.py
+"""Đo hiệu năng offline, không cần Google Maps hay site thật.
+
+    python benchmark.py                       # payload giả lập 20/100/400 địa điểm + 120 site giả
+    python benchmark.py --fixtures bench_fixtures --sites 300 --json ket_qua.json
+    python benchmark.py --compare ket_qua.json    # so với lần đo trước
+
+- Payload 'search?': sinh tổng hợp theo cấu trúc bản ghi địa điểm mà extract_rows_from_obj đọc, hoặc
+  đọc từ thư mục --fixtures (mỗi file là một body 'search?' đã lưu từ DevTools / SearchResponseTracker).
+- "Trang trại" site: một HTTP server cục bộ, mỗi site là một địa chỉ 127.0.x.y riêng (HttpEngine giới hạn
+  theo IP nên các site không dùng chung suất per-host). Có site email ở HOME, ở trang liên hệ, email bị
+  che (Cloudflare, [at]/[dot], thực thể HTML), không có email, trang JS rỗng, site chậm, 503, 403, 404.
+- Báo cáo mỗi giai đoạn: số đơn vị/s (dòng, trang, site), p50/p99 mỗi lần gọi, RSS đỉnh của tiến trình.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import crawler_logic as crawler
+import metrics
+
+# ==================================================
+# 1) PAYLOAD 'search?' GIẢ LẬP
+# ==================================================
+CATEGORIES = ["Nhà hàng", "Quán cà phê", "Khách sạn", "Spa", "Cửa hàng điện thoại", "Nha khoa", "Phòng gym"]
+STREETS = ["Lê Lợi", "Nguyễn Huệ", "Hai Bà Trưng", "Trần Hưng Đạo", "Điện Biên Phủ", "Võ Văn Tần"]
+
+def make_place_record(i: int, rnd: random.Random) -> list:
+    """Bản ghi địa điểm cùng bố cục với response thật: 9 toạ độ, 10 feature id, 11 tên, 39 địa chỉ, 7 website, 178 điện thoại..."""
+    rec = [None] * 180
+    name = f"{rnd.choice(CATEGORIES)} Demo {i}"
+    street = f"{rnd.randint(1, 300)} {rnd.choice(STREETS)}"
+    rec[1] = [[f"https://lh5.googleusercontent.com/p/AF1Qip{i:06d}{k}=w80-h106-k-no", 80, 106] for k in range(6)]
+    rec[2] = [street, "Quận 1", "Thành phố Hồ Chí Minh"]
+    rec[4] = [None, None, None, None, None, None, None, round(rnd.uniform(3, 5), 1), rnd.randint(1, 3000)]
+    if rnd.random() < 0.8: rec[7] = [f"https://site{i}.example.vn/", f"site{i}.example.vn", None, "0ahUKEwi" + "x" * 40]
+    rec[9] = [None, None, round(10.7 + rnd.uniform(-0.1, 0.1), 7), round(106.6 + rnd.uniform(-0.1, 0.1), 7)]
+    rec[10] = f"0x31752f{i:010x}:0x{rnd.getrandbits(60):x}"
+    rec[11] = name
+    rec[13] = [rnd.choice(CATEGORIES)]
+    rec[34] = [[["Thứ Hai", [[8, 0], [22, 0]]]] * 7]
+    rec[37] = [[[f"https://www.google.com/maps/contrib/{rnd.getrandbits(64)}", f"Đánh giá {k} " + "rất tốt " * 20] for k in range(5)]]
+    rec[39] = f"{street}, Quận 1, Thành phố Hồ Chí Minh"
+    rec[78] = f"ChIJ{i:08d}{rnd.getrandbits(40):x}"
+    rec[178] = [[f"028 {rnd.randint(1000, 9999)} {rnd.randint(1000, 9999)}", [[f"+8428{rnd.randint(10000000, 99999999)}", 1]]]]
+    return rec
+
+def make_search_body(n_places: int, seed: int = 0) -> str:
+    """Body 'search?' với n_places địa điểm, dạng )]}' + JSON như Maps trả về khi cuộn danh sách."""
+    rnd = random.Random(seed)
+    places = [[None, make_place_record(seed * 100000 + i, rnd)] for i in range(n_places)]
+    obj = [["Nhà hàng Quận 1", [None] * 8, [[0, 0], 17]], None, [None] * 20, places, ["0ahUKEwi" + "y" * 60, None] * 30]
+    return ")]}'\n" + json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def load_fixtures(path: str) -> dict:
+    """Đọc mọi file trong thư mục fixtures -> {tên file: body}."""
+    out = {}
+    for fn in sorted(os.listdir(path)):
+        fp = os.path.join(path, fn)
+        if os.path.isfile(fp):
+            with open(fp, "r", encoding="utf-8", errors="replace") as f: out[fn] = f.read()
+    return out
+
+def write_fixtures(path: str, sizes: list):
+    os.makedirs(path, exist_ok=True)
+    for n in sizes:
+        with open(os.path.join(path, f"search_{n}.txt"), "w", encoding="utf-8") as f: f.write(make_search_body(n, seed=n))
+
+# ==================================================
+# 2) "TRANG TRẠI" SITE CỤC BỘ
+# ==================================================
+# (loại site, kết quả mong đợi) - kết quả: "email" | "none" | "render" | "error"
+SITE_KINDS = [
+    ("home", "email"), ("contact", "email"), ("contact", "email"), ("obfuscated", "email"), ("cloudflare", "email"),
+    ("none", "none"), ("js_shell", "render"), ("slow", "email"), ("flaky", "error"), ("forbidden", "render"), ("missing", "none"),
+]
+FILLER = ("<p>Chúng tôi phục vụ khách hàng từ năm 2005 với đội ngũ tận tâm, sản phẩm chất lượng và giá cả hợp lý. "
+          "Hãy ghé thăm cửa hàng hoặc đặt lịch trực tuyến để được tư vấn miễn phí.</p>\n")
+NAV = ('<nav><a href="/">Trang chủ</a> <a href="/gioi-thieu">Giới thiệu</a> <a href="/san-pham">Sản phẩm</a> '
+       '<a href="/tin-tuc">Tin tức</a> <a href="/contact">Liên hệ</a></nav>\n')
+
+def _cfemail(email: str, key: int = 0x5a) -> str:
+    return f"{key:02x}" + "".join(f"{ord(c) ^ key:02x}" for c in email)
+
+def _page(title: str, body: str, pad: int = 40) -> str:
+    scripts = "".join(f'<script src="/static/app{k}.js"></script>' for k in range(4))
+    return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title>{scripts}"
+            f"<style>body{{font-family:sans-serif}}</style></head><body>{NAV}<main>{FILLER * pad}{body}</main>"
+            f"<footer>© {title}</footer></body></html>")
+
+def site_page(kind: str, i: int, path: str):
+    """Trả về (mã HTTP, HTML, số giây chờ trước khi trả) cho một trang của site giả."""
+    email = f"lienhe{i}@site{i}.example.vn"
+    title = f"Site {i}"
+    if kind == "flaky": return 503, "<h1>Service Unavailable</h1>", 0
+    if kind == "forbidden": return 403, "<h1>Forbidden</h1>", 0
+    if kind == "missing": return 404, "<h1>Not Found</h1>", 0
+    if kind == "js_shell":
+        return 200, '<!DOCTYPE html><html><head><script src="/bundle.js"></script></head><body><div id="root"></div></body></html>', 0
+    if path == "/":
+        return 200, _page(title, f"<p>Email: {email}</p>" if kind == "home" else ""), 0
+    if path == "/contact":
+        delay = 2.0 if kind == "slow" else 0
+        if kind in ("contact", "slow"): body = f'<p>Gửi thư tới <a href="mailto:{email}">{email}</a></p>'
+        elif kind == "obfuscated": body = f"<p>Email: lienhe{i} [at] site{i} [dot] example [dot] vn</p>"
+        elif kind == "cloudflare":
+            body = f'<p><a href="/cdn-cgi/l/email-protection#{_cfemail(email)}"><span class="__cf_email__" data-cfemail="{_cfemail(email)}">[email&#160;protected]</span></a></p>'
+        else: body = '<form><input type="text" name="ten"><textarea name="noi_dung"></textarea></form>'
+        return 200, _page("Liên hệ - " + title, body, pad=10), delay
+    return 200, _page(title, "", pad=20), 0
+
+class SiteFarm:
+    """HTTP server cục bộ phục vụ n site; site thứ i ở http://127.0.x.y:port/ (phân biệt theo địa chỉ IP đích)."""
+
+    def __init__(self, n_sites: int):
+        self.n = n_sites
+        farm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # giữ kết nối cho Session dùng lại
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/robots.txt": code, html, delay = 200, "User-agent: *\nAllow: /\n", 0
+                else:
+                    i = farm.site_of(self.connection.getsockname()[0])
+                    code, html, delay = site_page(farm.kind(i), i, path) if i is not None else (404, "", 0)
+                if delay: time.sleep(delay)
+                data = html.encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            def log_message(self, *args): pass
+
+        # Trên Linux cả dải 127.0.0.0/8 trỏ về loopback: nghe trên mọi địa chỉ để nhận kết nối tới 127.0.x.y
+        self.server = ThreadingHTTPServer(("0.0.0.0", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @staticmethod
+    def kind(i: int) -> str:
+        return SITE_KINDS[i % len(SITE_KINDS)][0]
+
+    @staticmethod
+    def expected(i: int) -> str:
+        return SITE_KINDS[i % len(SITE_KINDS)][1]
+
+    def url(self, i: int) -> str:
+        return f"http://127.0.{i // 250}.{i % 250 + 2}:{self.port}/"
+
+    def site_of(self, local_ip: str):
+        parts = local_ip.split(".")
+        i = int(parts[2]) * 250 + int(parts[3]) - 2
+        return i if 0 <= i < self.n else None
+
+    def __enter__(self):
+        self._thread.start(); return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown(); self.server.server_close()
+
+def loopback_range_available() -> bool:
+    """Có dùng được 127.0.0.2... không (Linux: có; macOS/Windows mặc định: không)."""
+    try:
+        with socket.create_connection(("127.0.0.2", 9), timeout=0.2): pass
+    except ConnectionRefusedError: return True
+    except OSError: return False
+    return True
+
+# ==================================================
+# 3) ĐO ĐẠC
+# ==================================================
+def peak_rss_mb():
+    try: import resource
+    except ImportError: return None  # Windows
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / (1024 * 1024) if sys.platform == "darwin" else kb / 1024  # macOS trả về byte
+
+def percentile(values: list, p: float) -> float:
+    if not values: return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, math.ceil(p / 100 * len(s)) - 1))]  # nearest-rank
+
+def run_stage(name: str, unit: str, calls: list, repeat: int = 1) -> dict:
+    """Gọi lần lượt từng hàm trong calls (mỗi hàm trả về số đơn vị đã xử lý), lặp repeat vòng."""
+    lat, units = [], 0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for fn in calls:
+            s = time.perf_counter(); units += fn(); lat.append(time.perf_counter() - s)
+    total = time.perf_counter() - t0
+    return {"stage": name, "unit": unit, "calls": len(lat), "units": units, "seconds": round(total, 4),
+            "rate": round(units / total, 1) if total else 0.0,
+            "p50_ms": round(percentile(lat, 50) * 1000, 3), "p99_ms": round(percentile(lat, 99) * 1000, 3),
+            "peak_rss_mb": None if peak_rss_mb() is None else round(peak_rss_mb(), 1)}
+
+def bench_payloads(bodies: dict, repeat: int) -> list:
+    results = []
+    for label, body in bodies.items():
+        cleaned = crawler.clean_google_maps_body(body)[1]
+        n_rows = len(crawler.extract_rows_from_body(body, label))
+        results.append(run_stage(f"clean_google_maps_body [{label}]", "body", [lambda: (crawler.clean_google_maps_body(body), 1)[1]], repeat))
+        results.append(run_stage(f"extract_rows_from_body [{label}]", "dòng", [lambda: len(crawler.extract_rows_from_body(body, label))], repeat))
+        results.append(run_stage(f"extract_rows_from_text [{label}]", "dòng", [lambda: len(crawler.extract_rows_from_text(cleaned, label))], repeat))
+        results[-1]["rows_per_body"] = n_rows
+    return results
+
+def bench_pages(n_sites: int, cfg: dict, repeat: int) -> list:
+    pages = []
+    for i in range(n_sites):
+        for path in ("/", "/contact"):
+            code, html, _ = site_page(SiteFarm.kind(i), i, path)
+            if code == 200: pages.append((f"http://site{i}.example.vn/", html))
+    hints, blocklist = cfg["contact_hints"], cfg["blocklist"]
+    return [
+        run_stage("extract_emails_from_html", "trang", [lambda h=h: (crawler.extract_emails_from_html(h, blocklist), 1)[1] for _, h in pages], repeat),
+        run_stage("pick_contact_links_from_html", "trang", [lambda u=u, h=h: (crawler.pick_contact_links_from_html(u, h, hints), 1)[1] for u, h in pages], repeat),
+    ]
+
+def classify_outcome(res: dict, expected: str) -> str:
+    status = res.get("Trạng thái", "")
+    if res.get("Email"): return "email"
+    if status == "transient": return "error"
+    if str(res.get("Selenium", "")).startswith("Cần"): return "render"
+    # Lần chạy cache nóng: site cần render đã được cache là "không có email" (benchmark không mở Chrome)
+    if status.endswith("(cache)") and expected == "render": return "render"
+    return "none"
+
+def bench_pipeline(farm: SiteFarm, cfg: dict, workers: int, label: str, cache) -> dict:
+    """Chạy crawl_site_emails (pha request + cache, không mở Chrome) trên mọi site của farm như get_emails_worker."""
+    lat, outcome, statuses = [], {"đúng": 0, "sai": 0}, {}
+
+    def one(i):
+        s = time.perf_counter()
+        try: res = crawler.crawl_site_emails(farm.url(i), cfg, cache, pool=None)
+        except crawler.TransientFetchError: res = {"Trạng thái": "transient"}
+        return i, res, time.perf_counter() - s
+
+    reg = metrics.Registry()
+    t0 = time.perf_counter()
+    with metrics.bind(reg), ThreadPoolExecutor(max_workers=workers) as ex:
+        ordered = crawler.HTTP.order_by_host(list(range(farm.n)), farm.url)
+        task = metrics.propagate(one)
+        for fut in as_completed([ex.submit(task, i) for i in ordered]):
+            i, res, dt = fut.result()
+            lat.append(dt)
+            exp = farm.expected(i)
+            got = classify_outcome(res, exp)
+            outcome["đúng" if got == exp else "sai"] += 1
+            status = " ".join(res.get("Trạng thái", "").split()[:4])  # bỏ phần URL riêng của từng site
+            statuses[status] = statuses.get(status, 0) + 1
+    total = time.perf_counter() - t0
+    return {"stage": f"pipeline {label}", "unit": "site", "calls": len(lat), "units": farm.n, "seconds": round(total, 4),
+            "rate": round(farm.n / total, 1) if total else 0.0,
+            "p50_ms": round(percentile(lat, 50) * 1000, 3), "p99_ms": round(percentile(lat, 99) * 1000, 3),
+            "peak_rss_mb": None if peak_rss_mb() is None else round(peak_rss_mb(), 1),
+            "outcome": outcome, "statuses": statuses, "metrics": reg.summary()}
+
+# ==================================================
+# 4) BÁO CÁO
+# ==================================================
+def print_report(results: list, previous: dict = None):
+    print(f"\n{'Giai đoạn':<48} {'tốc độ':>14} {'p50 ms':>10} {'p99 ms':>10} {'RSS MB':>8}" + ("   so với trước" if previous else ""))
+    print("-" * (94 + (16 if previous else 0)))
+    for r in results:
+        rate = f"{r['rate']:,.1f} {r['unit']}/s"
+        line = f"{r['stage'][:48]:<48} {rate:>14} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {r['peak_rss_mb'] if r['peak_rss_mb'] is not None else 'n/a':>8}"
+        old = (previous or {}).get(r["stage"])
+        if old and old.get("rate"): line += f"   x{r['rate'] / old['rate']:.2f}"
+        print(line)
+        if "outcome" in r:
+            print(f"{'':<4}kết quả: {r['outcome']}  trạng thái: {r['statuses']}")
+            for stage, st in r["metrics"]["stages"].items():
+                print(f"{'':<4}{stage:<16} n={st['count']:<6} p50={st['p50_ms']} ms  p95={st['p95_ms']} ms  max={st['max_ms']} ms")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark offline cho trích xuất Maps và pipeline lấy email.")
+    ap.add_argument("--sizes", default="20,100,400", help="số địa điểm trong mỗi payload giả lập")
+    ap.add_argument("--fixtures", help="thư mục chứa body 'search?' đã lưu (thay cho payload giả lập)")
+    ap.add_argument("--write-fixtures", metavar="DIR", help="ghi payload giả lập ra thư mục rồi thoát")
+    ap.add_argument("--sites", type=int, default=120, help="số site trong trang trại cục bộ (0 = bỏ qua pipeline)")
+    ap.add_argument("--workers", type=int, help="số luồng pipeline (mặc định request_workers trong cấu hình)")
+    ap.add_argument("--host-delay", type=float, default=0.0, help="http_host_delay khi benchmark (mặc định 0 để đo thuần)")
+    ap.add_argument("--repeat", type=int, default=3, help="số vòng lặp cho các giai đoạn trích xuất")
+    ap.add_argument("--json", help="ghi kết quả ra file JSON")
+    ap.add_argument("--compare", help="file JSON của lần đo trước để so sánh tốc độ")
+    args = ap.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    if args.write_fixtures:
+        write_fixtures(args.write_fixtures, sizes); print(f"Đã ghi {len(sizes)} fixture vào {args.write_fixtures}"); return
+
+    cfg = crawler.ConfigManager.load()
+    # Trang liên hệ của site giả nằm ở /contact
+    if not any("contact" in h.lower() for h in cfg["contact_hints"]): cfg["contact_hints"] = list(cfg["contact_hints"]) + ["contact"]
+    bodies = load_fixtures(args.fixtures) if args.fixtures else {f"{n} địa điểm": make_search_body(n, seed=n) for n in sizes}
+    results = bench_payloads(bodies, args.repeat)
+    results += bench_pages(max(args.sites, len(SITE_KINDS)), cfg, args.repeat)
+
+    if args.sites > 0 and not loopback_range_available():
+        print("Bỏ qua pipeline: máy này không có dải loopback 127.0.0.0/8 (cần mỗi site một địa chỉ IP riêng).")
+    elif args.sites > 0:
+        workers = args.workers or cfg["request_workers"]
+        crawler.HTTP.configure(cfg["http_max_total"], cfg["http_max_per_host"], args.host_delay, 0, True)
+        fd, cache_path = tempfile.mkstemp(suffix=".sqlite3"); os.close(fd)
+        cache = crawler.DomainCache(cache_path)
+        try:
+            with SiteFarm(args.sites) as farm:
+                results.append(bench_pipeline(farm, cfg, workers, f"lạnh ({workers} luồng)", cache))
+                results.append(bench_pipeline(farm, cfg, workers, f"cache nóng ({workers} luồng)", cache))
+        finally:
+            cache.close()
+            for suffix in ("", "-wal", "-shm"):
+                try: os.remove(cache_path + suffix)
+                except OSError: pass
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f: previous = {r["stage"]: r for r in json.load(f)["results"]}
+    print_report(results, previous)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0], "results": results}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
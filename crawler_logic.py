@@ -4,15 +4,27 @@ import json
 import re
 import os
 import base64
+import socket
+import urllib.robotparser
+import threading
+from queue import Queue, Empty
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, TimeoutError as FutureTimeout
 from urllib.parse import urlparse
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from domain_cache import DomainCache
+import metrics
 
 # ==========================
 # 0) CẤU HÌNH
@@ -23,7 +35,11 @@ class ConfigManager:
         "sub_keywords": [], "contact_hints": [], "blocklist": [],
         "headless": True, "max_scroll": 60, "delay": 2.2, "request_workers": 4,
         "selenium_workers": 1, "selenium_contact_limit": 4, "selenium_wait_body": 3,
-        "selenium_wait_click": 1, "selenium_sleep_per_page": 0.8
+        "selenium_wait_click": 1, "selenium_sleep_per_page": 0.8,
+        "http_max_total": 16, "http_max_per_host": 2, "http_host_delay": 1.0, "http_retries": 2, "respect_robots": True, "smart_escalation": True, "selenium_block_resources": True, "driver_max_uses": 40,
+        "cache_ttl_hours": 720, "cache_negative_ttl_hours": 72,
+        "harvest_workers": 3, "harvest_retries": 1, "harvest_min_interval": 2.0,
+        "distributed_mode": False, "worker_token": "", "lease_seconds": 300, "task_max_attempts": 3
     }
     @classmethod
     def load(cls):
@@ -41,92 +57,36 @@ class ConfigManager:
         except Exception: return False
 
 # ==================================================
-# 2) DỌN DẸP RESPONSE GOOGLE MAPS
+# 2) + 3) DỌN DẸP & TRÍCH XUẤT RESPONSE GOOGLE MAPS: xem parsing.py
 # ==================================================
-def clean_google_maps_body(raw: str):
-    if raw is None: return None, ""
-    s = raw.strip()
-    if s.endswith('/*""*/'): s = s[:-6].rstrip()
-    def try_parse_json(txt: str):
-        try: return json.loads(txt)
-        except Exception: return None
-    if s.startswith(")]}'\n"):
-        s2 = s[5:].lstrip(); obj = try_parse_json(s2)
-        return (obj, s2) if obj is not None else (None, s2)
-    if s.startswith(")]}'"):
-        nl = s.find("\n"); s2 = s[nl + 1:] if nl != -1 else s[4:]
-        obj = try_parse_json(s2)
-        return (obj, s2) if obj is not None else (None, s2)
-    obj = try_parse_json(s)
-    if obj is not None:
-        if isinstance(obj, dict) and isinstance(obj.get("d"), str):
-            inner = obj["d"].lstrip()
-            if inner.startswith(")]}'\n"): inner = inner[5:].lstrip()
-            elif inner.startswith(")]}'"):
-                nl = inner.find("\n"); inner = inner[nl + 1:] if nl != -1 else inner[4:]
-            obj2 = try_parse_json(inner)
-            return (obj2, inner) if obj2 is not None else (None, inner)
-        return obj, s
-    return None, s
-
-# ===========================================================
-# 3) TRÍCH XUẤT THÔNG TIN (VIẾT LẠI CHÍNH XÁC NHƯ BẢN GỐC)
-# ===========================================================
-def extract_address_from_text(text: str, name: str) -> str:
-    m = re.search(r'"' + re.escape(name) + r',\s*[^"]*"', text)
-    return m.group(0).strip('"') if m else ""
-
-def find_businesses_from_text(text: str):
-    pat = re.compile(r'\[\s*null\s*,\s*null\s*,\s*(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)\s*\]\s*,\s*"(?:[^"]+)"\s*,\s*"([^"]+)"')
-    for m in pat.finditer(text):
-        yield m.group(3), m.start(3)
-
-def extract_website_near(text: str, name: str, pos: int, window: int = 12000) -> str:
-    start = max(0, pos - window)
-    end = min(len(text), pos + window)
-    chunk = text[start:end]
-    urls = [m.group(0).strip('"') for m in re.finditer(r'"https?://[^"]+"', chunk)]
-    if not urls: return ""
-    
-    def is_business_url(u: str) -> bool:
-        u2 = u.lower()
-        bad = ("google.com", "gstatic.com", "ggpht.com", "googleusercontent.com", "/maps")
-        return not any(b in u2 for b in bad)
-    
-    cands = [u for u in urls if is_business_url(u)]
-    if not cands: return ""
-    
-    tokens = [t for t in re.findall(r"[a-zA-Z0-9]+", name.lower()) if len(t) >= 3]
-    best_url, best_score = "", float("-inf")
-    for u in cands:
-        u_lower = u.lower()
-        url_pos = chunk.find(u)
-        dist = abs((start + url_pos) - pos) if url_pos != -1 else 10**9
-        score = -dist
-        if any(t in u_lower for t in tokens): score += 2000
-        if u.count("?") == 0: score += 100
-        if score > best_score: best_score, best_url = score, u
-    return best_url
-
-def extract_rows_from_text(big_text: str, kw_label: str):
-    rows, seen = [], set()
-    for name, pos in find_businesses_from_text(big_text):
-        if name in seen: continue
-        seen.add(name)
-        rows.append({
-            "Từ khóa": kw_label,
-            "Tên": name,
-            "Địa chỉ": extract_address_from_text(big_text, name) or "",
-            "Trang web": extract_website_near(big_text, name, pos) or "",
-            "Email": "", "Trạng thái": "Chưa lấy"
-        })
-    return rows
+from parsing import clean_google_maps_body, PayloadIndex, extract_rows_from_text, extract_rows_from_body, row_key
 
 # ==================================================
 # 4) SELENIUM & LOGIC CHÍNH
 # ==================================================
-def build_driver(headless: bool = True):
+@lru_cache(maxsize=1)
+def _chromedriver_path() -> str:
+    # ChromeDriverManager().install() kiểm tra phiên bản qua mạng: chỉ chạy một lần mỗi tiến trình.
     from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+# Chế độ render nhẹ: chặn ảnh, font, media và tracker qua CDP
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3", "*.m4a", "*.ogg", "*.avi", "*.mov",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*facebook.net*", "*connect.facebook.com*", "*hotjar.com*", "*clarity.ms*", "*youtube.com/embed*", "*player.vimeo.com*",
+]
+
+def block_heavy_resources(driver):
+    """Áp dụng danh sách chặn cho tab hiện tại (CDP Network.setBlockedURLs chỉ tác động lên tab đang chọn)."""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    except Exception: pass
+
+def build_driver(headless: bool = True, block_resources: bool = False):
     from selenium.webdriver.chrome.service import Service as ChromeService
     chrome_options = Options()
     if headless: chrome_options.add_argument("--headless=new")
@@ -134,79 +94,293 @@ def build_driver(headless: bool = True):
     chrome_options.add_argument("--disable-dev-shm-usage"); chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-blink-features=AutomationControlled"); chrome_options.add_argument("--window-size=1200,900")
     chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
-    service = ChromeService(ChromeDriverManager().install())
+    if block_resources:
+        # driver.get trả về ngay khi DOM sẵn sàng; ảnh bị tắt cho mọi tab (kể cả tab mới mở)
+        chrome_options.page_load_strategy = "eager"
+        chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    service = ChromeService(_chromedriver_path())
     driver = webdriver.Chrome(service=service, options=chrome_options)
-    try: driver.execute_cdp_cmd("Network.enable", {})
-    except Exception: pass
+    if block_resources: block_heavy_resources(driver)
+    else:
+        try: driver.execute_cdp_cmd("Network.enable", {})
+        except Exception: pass
+    driver.block_resources = block_resources
     return driver
 
-def scroll_until_end(driver, log_callback, max_rounds: int, delay: float):
+class DriverPool:
+    """Pool Chrome có giới hạn, an toàn luồng: mượn/trả driver, dọn trạng thái giữa các site, thay driver sau N lần dùng hoặc khi lỗi."""
+
+    def __init__(self, size: int, headless: bool = True, max_uses: int = 40, log_callback=None, clear_state: bool = True, block_resources: bool = False, name: str = "email"):
+        self.size, self.headless, self.max_uses = max(1, int(size)), headless, max(1, int(max_uses))
+        # Xoá cookie/storage giữa các lần dùng (site này không thấy dữ liệu của site trước)
+        self.clear_state = clear_state
+        self.block_resources, self.name = block_resources, name
+        self._log = log_callback or (lambda msg: None)
+        self._idle = Queue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _new_driver(self):
+        with metrics.timed("driver_start"):
+            d = build_driver(headless=self.headless, block_resources=self.block_resources)
+        metrics.inc("crawl_drivers_total", event="start", pool=self.name)
+        metrics.add_gauge("crawl_drivers_active", 1, pool=self.name)
+        with self._lock: self._uses[id(d)] = 0
+        return d
+
+    def _discard(self, driver):
+        with self._lock: self._uses.pop(id(driver), None)
+        metrics.inc("crawl_drivers_total", event="quit", pool=self.name)
+        metrics.add_gauge("crawl_drivers_active", -1, pool=self.name)
+        try: driver.quit()
+        except Exception: pass
+
+    def _reset(self, driver):
+        handles, origins = driver.window_handles, set()
+        for h in reversed(handles):
+            driver.switch_to.window(h)
+            if self.clear_state:
+                try: origins.add(driver.execute_script("return window.location.origin"))
+                except Exception: pass
+            if h != handles[0]: driver.close()
+        driver.switch_to.window(handles[0])
+        if self.clear_state:
+            # delete_all_cookies() chỉ xoá cookie của trang hiện tại -> xoá toàn bộ qua CDP khi còn đang ở site cũ
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            for origin in origins:
+                if origin and origin.startswith("http"):
+                    driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        driver.get("about:blank")
+        try: driver.get_log("performance")  # bỏ log cũ để không lẫn sang site sau
+        except Exception: pass
+
+    @contextmanager
+    def driver(self):
+        """Mượn một driver; tự trả lại khi xong. Nếu khối lệnh ném lỗi, driver bị thay mới."""
+        self._slots.acquire()
+        d, broken = None, False
+        try:
+            try: d = self._idle.get_nowait()
+            except Empty: d = None
+            if d is None: d = self._new_driver()
+            yield d
+        except Exception:
+            broken = True; raise
+        finally:
+            try:
+                if d is not None: self._release(d, broken)
+            finally: self._slots.release()
+
+    def _release(self, d, broken: bool):
+        with self._lock:
+            self._uses[id(d)] = self._uses.get(id(d), 0) + 1
+            worn = self._uses[id(d)] >= self.max_uses
+        if broken or worn or self._closed:
+            self._discard(d); return
+        try: self._reset(d)
+        except Exception:
+            self._discard(d); return
+        self._idle.put(d)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try: self._discard(self._idle.get_nowait())
+            except Empty: break
+
+def iter_scroll_rounds(driver, log_callback, max_rounds: int, delay: float, tracker=None, idle_limit: int = 3):
+    """Cuộn panel kết quả theo nhịp thích ứng; yield danh sách body 'search?' mới sau mỗi lần cuộn.
+
+    Sau mỗi lần cuộn chỉ chờ tới khi có response 'search?' mới (cần tracker) hoặc feed có thêm phần tử,
+    tối đa `delay` giây. Vòng nào không có gì mới thì lần chờ sau dài gấp rưỡi; sau idle_limit vòng
+    liên tiếp không có gì mới coi như đã hết kết quả. Trả về True nếu đã tới cuối.
+    """
     try:
         container = WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.XPATH, "//div[@role='feed']")))
     except TimeoutException:
         log_callback("❌ Không tìm thấy panel kết quả."); return False
+    def feed_size():
+        try: return driver.execute_script("return arguments[0].childElementCount;", container) or 0
+        except Exception: return 0
+    count, wait, idle = feed_size(), delay, 0
     for i in range(1, max_rounds + 1):
+        t0 = time.perf_counter()
         driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight;", container)
         log_callback(f"Đang cuộn lần {i}/{max_rounds}…")
-        time.sleep(delay)
-        if driver.find_elements(By.XPATH, "//span[contains(text(), 'Bạn đã xem hết danh sách này.')]"):
-            log_callback("✔️ Đã cuộn tới cuối."); return True
+        bodies, grew, deadline = [], False, time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(0.2)
+            if tracker is not None: bodies += tracker.poll()
+            n = feed_size()
+            if n > count: count, grew = n, True
+            if bodies or grew: break
+        metrics.observe("crawl_stage_seconds", time.perf_counter() - t0, stage="scroll_round")
+        yield bodies
+        if bodies or grew:
+            idle, wait = 0, delay
+        else:
+            idle, wait = idle + 1, min(wait * 1.5, delay * 3)
+            if idle >= idle_limit:
+                log_callback("✔️ Đã cuộn tới cuối (không còn kết quả mới)."); return True
     log_callback("⚠️ Dừng vì đạt số lần cuộn tối đa."); return False
 
-def collect_search_bodies_via_perflog(driver, log_callback):
-    logs = driver.get_log("performance")
-    search_responses = []
-    for entry in logs:
-        try:
-            msg = json.loads(entry["message"]).get("message", {})
-            if msg.get("method") == "Network.responseReceived":
-                if "search?" in msg.get("params", {}).get("response", {}).get("url", ""):
-                    search_responses.append(msg["params"].get("requestId"))
-        except Exception: continue
-    results = []
-    seen_ids = set()
-    for req_id in filter(None, search_responses):
-        if req_id in seen_ids: continue
-        seen_ids.add(req_id)
+class SearchResponseTracker:
+    """Đọc perf log theo từng đợt và lấy body của các response 'search?' ngay khi chúng tải xong."""
+
+    def __init__(self, driver, log_callback):
+        self.driver, self.log_callback = driver, log_callback
+        self._pending, self._seen = set(), set()
+
+    def _read_body(self, req_id: str):
         try:
-            body_obj = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": req_id})
-            body = base64.b64decode(body_obj["body"]).decode("utf-8", "ignore") if body_obj.get("base64Encoded") else body_obj.get("body", "")
-            results.append({"body_text": body})
-        except Exception as e: log_callback(f"⚠️ Lỗi đọc body response: {e}")
-    log_callback(f"Đã lấy được {len(results)} response 'search?'.")
-    return results
-
-def harvest_one_query(main_kw, sub_kw, headless, max_rounds, delay, log_callback):
+            with metrics.timed("read_body"):
+                body_obj = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": req_id})
+            metrics.inc("crawl_search_bodies_total")
+            return base64.b64decode(body_obj["body"]).decode("utf-8", "ignore") if body_obj.get("base64Encoded") else body_obj.get("body", "")
+        except Exception as e:
+            self.log_callback(f"⚠️ Lỗi đọc body response: {e}"); return None
+
+    def poll(self) -> list:
+        """Trả về body của các response 'search?' đã tải xong kể từ lần gọi trước."""
+        ready = []
+        for entry in self.driver.get_log("performance"):
+            try:
+                msg = json.loads(entry["message"]).get("message", {})
+                method, params = msg.get("method"), msg.get("params", {})
+                req_id = params.get("requestId")
+                if not req_id: continue
+                if method == "Network.responseReceived":
+                    if req_id not in self._seen and "search?" in params.get("response", {}).get("url", ""):
+                        self._seen.add(req_id); self._pending.add(req_id)
+                elif method == "Network.loadingFinished" and req_id in self._pending:
+                    self._pending.discard(req_id); ready.append(req_id)
+            except Exception: continue
+        return [b for b in map(self._read_body, ready) if b is not None]
+
+    def flush(self) -> list:
+        """Đọc nốt các response chưa thấy sự kiện loadingFinished."""
+        bodies = self.poll()
+        pending, self._pending = list(self._pending), set()
+        return bodies + [b for b in map(self._read_body, pending) if b is not None]
+
+def iter_harvest_rows(driver, main_kw, sub_kw, max_rounds, delay, log_callback):
+    """Generator: mở Maps, cuộn và trích xuất từng response 'search?' ngay trong lúc cuộn, bỏ qua địa điểm đã gặp."""
     kw_label = f"{main_kw} | {sub_kw}" if sub_kw else main_kw
     q = f"{main_kw} {sub_kw}".strip() if sub_kw else main_kw
-    driver = None
+    seen = set()
+    def rows_from(bodies):
+        for body_text in bodies:
+            with metrics.timed("extract"): rows = extract_rows_from_body(body_text, kw_label)
+            metrics.inc("crawl_rows_total", len(rows))
+            for row in rows:
+                key = row_key(row)
+                if key in seen: continue
+                seen.add(key)
+                yield row
+    driver.get(f"https://www.google.com/maps/search/{q.replace(' ', '+')}")
+    log_callback(f"[{kw_label}] Đã mở Maps, bắt đầu cuộn...")
+    tracker = SearchResponseTracker(driver, log_callback)
+    for bodies in iter_scroll_rounds(driver, log_callback, max_rounds, delay, tracker=tracker):
+        yield from rows_from(bodies)
+    yield from rows_from(tracker.flush())
+
+# ==================================================
+# 4b) HARVEST SONG SONG NHIỀU TIẾN TRÌNH
+# ==================================================
+class RateLimiter:
+    """Giãn cách thời điểm bắt đầu truy vấn Maps, dùng chung giữa các tiến trình."""
+
+    def __init__(self, min_interval: float, ctx=multiprocessing):
+        self.min_interval = max(0.0, float(min_interval))
+        self._next = ctx.Value("d", 0.0, lock=False)
+        self._lock = ctx.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next.value)
+            self._next.value = start + self.min_interval
+        if start > now: time.sleep(start - now)
+
+_PROC = {}  # trạng thái riêng của mỗi tiến trình harvest con
+
+def _harvest_proc_init(events, limiter, headless, max_uses):
+    _PROC.update(events=events, limiter=limiter)
+    # Chrome harvest chỉ mở Google Maps: giữ cookie (đồng ý điều khoản...) giữa các truy vấn
+    _PROC["pool"] = DriverPool(1, headless=headless, max_uses=max_uses, log_callback=lambda m: events.put(("log", m)), clear_state=False, name="harvest")
+    multiprocessing.util.Finalize(None, _PROC["pool"].close, exitpriority=10)
+
+def _harvest_proc_run(main_kw, sub_kw, max_rounds, delay, retries):
+    """Chạy trong tiến trình con: harvest một truy vấn bằng Chrome riêng của tiến trình, gửi từng dòng về cha."""
+    events, pool = _PROC["events"], _PROC["pool"]
+    log_callback = lambda msg: events.put(("log", msg))
+    kw_label = f"{main_kw} | {sub_kw}" if sub_kw else main_kw
+    for attempt in range(1, retries + 2):
+        _PROC["limiter"].wait()
+        n = 0
+        try:
+            with metrics.timed("harvest_query"), pool.driver() as driver:
+                for row in iter_harvest_rows(driver, main_kw, sub_kw, max_rounds, delay, log_callback):
+                    events.put(("row", row)); n += 1
+            log_callback(f"[{kw_label}] ✅ Trích xuất được {n} mục.")
+            # Số liệu của tiến trình con được gửi về cha trước 'done' để tóm tắt của job đủ khi truy vấn xong
+            events.put(("metrics", metrics.REGISTRY.snapshot(reset=True)))
+            events.put(("done", ((main_kw, sub_kw), True)))
+            return n
+        except Exception as e:
+            log_callback(f"[{kw_label}] ❌ Lỗi (lần {attempt}/{retries + 1}): {e}")
+            events.put(("metrics", metrics.REGISTRY.snapshot(reset=True)))
+            if attempt > retries:
+                events.put(("done", ((main_kw, sub_kw), False))); raise
+            time.sleep(min(30, 2 ** attempt))
+
+def harvest_parallel(queries, cfg: dict, log_callback, on_row, on_query_done=None):
+    """Chia lưới (main_kw, sub_kw) cho một pool tiến trình, mỗi tiến trình giữ một Chrome.
+
+    Dòng và log được stream về tiến trình cha qua một Queue; on_row chạy ở tiến trình cha (nơi loại trùng).
+    on_query_done((main_kw, sub_kw), ok) được gọi khi một truy vấn xong hoặc hết lượt thử lại.
+    Trả về tổng số dòng nhận được (trước khi loại trùng).
+    """
+    ctx = multiprocessing.get_context("spawn")
+    events = ctx.Queue()
+    limiter = RateLimiter(cfg["harvest_min_interval"], ctx)
+    received = [0]
+    def drain():
+        while True:
+            kind, payload = events.get()
+            if kind is None: return
+            try:
+                if kind == "row":
+                    received[0] += 1; on_row(payload)
+                elif kind == "done":
+                    # Đi cùng queue với các dòng nên chỉ tới sau khi mọi dòng của truy vấn đã được xử lý
+                    if on_query_done: on_query_done(*payload)
+                elif kind == "metrics": metrics.merge(payload)
+                else: log_callback(payload)
+            except Exception as e: log_callback(f"⚠️ Lỗi xử lý kết quả harvest: {e}")
+    drainer = threading.Thread(target=metrics.propagate(drain), daemon=True); drainer.start()
+    n_workers = max(1, min(int(cfg["harvest_workers"]), len(queries)))
+    # Chrome của tiến trình con không nằm trong REGISTRY của tiến trình này: mỗi tiến trình con giữ một Chrome
+    metrics.add_gauge("crawl_drivers_active", n_workers, pool="harvest")
     try:
-        driver = build_driver(headless=headless)
-        driver.get(f"https://www.google.com/maps/search/{q.replace(' ', '+')}")
-        log_callback(f"[{kw_label}] Đã mở Maps, bắt đầu cuộn...")
-        scroll_until_end(driver, log_callback, max_rounds, delay)
-        bodies = collect_search_bodies_via_perflog(driver, log_callback)
-        big_text_parts = []
-        for item in bodies:
-            body_text = item.get("body_text", "")
-            obj, cleaned_text = clean_google_maps_body(body_text)
-            if obj is not None:
-                big_text_parts.append(json.dumps(obj, ensure_ascii=False))
-            else:
-                big_text_parts.append(cleaned_text)
-        big_text = "\n".join(big_text_parts)
-        rows = extract_rows_from_text(big_text, kw_label)
-        log_callback(f"[{kw_label}] ✅ Trích xuất được {len(rows)} mục.")
-        return rows
-    except Exception as e:
-        log_callback(f"[{kw_label}] ❌ Lỗi: {e}"); return []
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx, initializer=_harvest_proc_init,
+                                 initargs=(events, limiter, cfg["headless"], cfg["driver_max_uses"])) as ex:
+            futs = {ex.submit(_harvest_proc_run, mk, sk, cfg["max_scroll"], cfg["delay"], int(cfg["harvest_retries"])): (mk, sk) for mk, sk in queries}
+            for fut in as_completed(futs):
+                try: fut.result()
+                except Exception as e: log_callback(f"Lỗi tiến trình harvest {futs[fut]}: {e}")
     finally:
-        if driver: driver.quit()
+        # Tiến trình con đã thoát nên mọi sự kiện của chúng đã nằm trong queue trước tín hiệu kết thúc
+        events.put((None, None)); drainer.join()
+        metrics.add_gauge("crawl_drivers_active", -n_workers, pool="harvest")
+    return received[0]
 
 # ======================================================
 # 5) TRÍCH XUẤT EMAIL & LINK LIÊN HỆ
 # ======================================================
-EMAIL_RE = re.compile(r'(?i)(?<![\w.\-])([A-Z0-9._%+\-]+@[A-Z0-9\-]+(?:\.[A-Z0-9\-]+)+)(?![\w.\-])')
+from parsing import extract_emails_from_html, pick_contact_links_from_html, classify_escalation
 
 def normalize_url(u: str) -> str:
     u = (u or "").strip().strip('"')
@@ -217,76 +391,369 @@ def canonical_domain(u: str) -> str:
     except Exception: host = ""
     return host[4:] if host.startswith("www.") else host.lower()
 
+class TransientFetchError(Exception):
+    """Lỗi tạm thời (timeout, mất kết nối, 429, 5xx) vẫn còn sau khi đã thử lại: nên chạy lại sau, không chuyển sang Selenium."""
+
+class PermanentFetchError(Exception):
+    """Lỗi cố định (4xx, SSL, tên miền không tồn tại...): thử lại không có ích."""
+    def __init__(self, msg: str, status_code: int = None):
+        super().__init__(msg); self.status_code = status_code
+
+class RobotsDisallowed(PermanentFetchError):
+    """robots.txt của site không cho phép tải URL này."""
+
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# Cache DNS theo tiến trình: kết quả tốt giữ lâu, tên miền không tồn tại chỉ giữ ngắn, lỗi tạm thời (EAI_AGAIN, timeout) không cache
+DNS_OK_TTL, DNS_NXDOMAIN_TTL, DNS_CACHE_MAX, DNS_TIMEOUT = 3600.0, 300.0, 8192, 5.0
+DNS_PERMANENT_ERRNOS = {e for e in (getattr(socket, "EAI_NONAME", None), getattr(socket, "EAI_NODATA", None)) if e is not None}
+_dns_cache, _dns_lock = {}, threading.Lock()
+# getaddrinfo không có timeout: chạy trong pool riêng để một resolver chậm không giữ luồng tải quá DNS_TIMEOUT
+_dns_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="dns")
+
+def lookup_host(host: str):
+    """(IP, lỗi) của host, cả IPv4 lẫn IPv6. lỗi: "" nếu phân giải được, "nxdomain" nếu tên miền không tồn tại, "transient" nếu lỗi tạm thời."""
+    with _dns_lock: hit = _dns_cache.get(host)
+    if hit and time.monotonic() < hit[0]: return hit[1], hit[2]
+    try:
+        infos = _dns_pool.submit(socket.getaddrinfo, host, None, socket.AF_UNSPEC, socket.SOCK_STREAM).result(timeout=DNS_TIMEOUT)
+        ip, err, ttl = infos[0][4][0], "", DNS_OK_TTL
+    except FutureTimeout: ip, err, ttl = "", "transient", 0
+    except UnicodeError: ip, err, ttl = "", "nxdomain", DNS_NXDOMAIN_TTL
+    except socket.gaierror as e:
+        ip, err, ttl = "", "nxdomain" if e.errno in DNS_PERMANENT_ERRNOS else "transient", DNS_NXDOMAIN_TTL
+    except OSError: ip, err, ttl = "", "transient", 0
+    if err != "transient":
+        with _dns_lock:
+            _dns_cache.pop(host, None); _dns_cache[host] = (time.monotonic() + ttl, ip, err)
+            while len(_dns_cache) > DNS_CACHE_MAX: _dns_cache.pop(next(iter(_dns_cache)))
+    return ip, err
+
+class HttpEngine:
+    """Session dùng chung (keep-alive, pool kết nối theo host) với phép lịch sự theo host.
+
+    - Giới hạn đồng thời toàn cục và theo IP của host (nhiều site trên cùng shared hosting tính là một host),
+      kèm khoảng nghỉ tối thiểu giữa hai request tới cùng IP.
+    - robots.txt được cache theo origin.
+    - Lỗi tạm thời được thử lại với backoff luỹ thừa (tôn trọng Retry-After); hết lượt thì ném TransientFetchError.
+    """
+    HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"}
+    ROBOTS_TTL = 6 * 3600
+    ROBOTS_MAX = 4096  # số origin giữ robots.txt; cũ nhất bị bỏ trước
+
+    def __init__(self, max_total: int = 16, max_per_host: int = 2, host_delay: float = 1.0, retries: int = 2, respect_robots: bool = True):
+        self._lock = threading.Lock()
+        self._session = None; self._pool = None; self._settings = None
+        self.configure(max_total, max_per_host, host_delay, retries, respect_robots)
+
+    def configure(self, max_total: int, max_per_host: int, host_delay: float = 1.0, retries: int = 2, respect_robots: bool = True):
+        # Gọi lúc bắt đầu một tác vụ. Cấu hình không đổi thì giữ nguyên session/pool (job khác có thể đang dùng);
+        # khi đổi, request đang chạy vẫn giữ semaphore, session và pool cũ cho tới khi xong.
+        settings = (max(1, int(max_total)), max(1, int(max_per_host)), max(0.0, float(host_delay)), max(0, int(retries)), bool(respect_robots))
+        with self._lock:
+            if self._session is not None and settings == self._settings: return
+            self._settings = settings
+            self.max_total, self.max_per_host, self.host_delay, self.retries, self.respect_robots = settings
+            self._total = threading.BoundedSemaphore(self.max_total)
+            self._hosts, self._next_slot, self._robots = {}, {}, OrderedDict()
+            self._prune_at = 1024
+            old_pool, self._pool = self._pool, ThreadPoolExecutor(max_workers=self.max_total, thread_name_prefix="http")
+            sess = requests.Session(); sess.headers.update(self.HEADERS)
+            adapter = HTTPAdapter(pool_connections=64, pool_maxsize=self.max_per_host * 2)
+            sess.mount("http://", adapter); sess.mount("https://", adapter)
+            self._session = sess
+        # Không đóng session cũ: request đang chạy của job khác vẫn dùng nó (tự giải phóng khi hết tham chiếu).
+        # shutdown(wait=False) vẫn để các việc đã gửi vào pool cũ chạy xong.
+        if old_pool: old_pool.shutdown(wait=False)
+
+    @contextmanager
+    def _host_slot(self, key: str):
+        """Giữ một suất của host; semaphore của host bị bỏ khi không còn luồng nào dùng (app chạy lâu không phình bộ nhớ)."""
+        with self._lock:
+            slot = self._hosts.get(key)
+            if slot is None: slot = self._hosts[key] = [threading.BoundedSemaphore(self.max_per_host), 0]
+            slot[1] += 1
+        try:
+            with slot[0]: yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0 and self._hosts.get(key) is slot: self._hosts.pop(key)
+
+    def _wait_turn(self, key: str):
+        """Giữ khoảng cách host_delay giữa các lần bắt đầu request tới cùng một host."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot.get(key, 0.0))
+            self._next_slot[key] = start + self.host_delay
+            # Mốc đã qua không còn tác dụng (max(now, mốc) = now): dọn định kỳ để app chạy lâu không phình bộ nhớ
+            if len(self._next_slot) > self._prune_at:
+                self._next_slot = {k: t for k, t in self._next_slot.items() if t > now}
+                self._prune_at = max(1024, 2 * len(self._next_slot))
+        if start > now: time.sleep(start - now)
+
+    def _robots_for(self, url: str):
+        p = urlparse(url)
+        origin = f"{p.scheme}://{p.netloc}"
+        with self._lock:
+            hit = self._robots.get(origin)
+        if hit and time.monotonic() - hit[0] < self.ROBOTS_TTL: return hit[1]
+        rp = urllib.robotparser.RobotFileParser()
+        try:
+            r = self._session.get(origin + "/robots.txt", timeout=10)
+            if r.status_code in (401, 403): rp.disallow_all = True
+            elif r.status_code >= 400: rp.allow_all = True
+            else: rp.parse(r.text.splitlines())
+        except requests.RequestException:
+            rp.allow_all = True  # không đọc được robots.txt thì coi như cho phép
+        with self._lock:
+            self._robots.pop(origin, None); self._robots[origin] = (time.monotonic(), rp)
+            while len(self._robots) > self.ROBOTS_MAX: self._robots.popitem(last=False)
+        return rp
+
+    def _get_once(self, url: str, timeout: int) -> str:
+        try:
+            r = self._session.get(url, timeout=timeout)
+        except requests.exceptions.SSLError as e:
+            metrics.inc("crawl_http_requests_total", outcome="ssl_error"); raise PermanentFetchError(str(e)) from e
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            metrics.inc("crawl_http_requests_total", outcome="timeout"); raise TransientFetchError(str(e)) from e
+        except requests.RequestException as e:
+            metrics.inc("crawl_http_requests_total", outcome="error"); raise PermanentFetchError(str(e)) from e
+        if r.status_code in TRANSIENT_STATUS:
+            metrics.inc("crawl_http_requests_total", outcome="transient")
+            err = TransientFetchError(f"HTTP {r.status_code} - {url}")
+            err.retry_after = r.headers.get("Retry-After")
+            raise err
+        if r.status_code >= 400:
+            metrics.inc("crawl_http_requests_total", outcome="http_4xx")
+            raise PermanentFetchError(f"HTTP {r.status_code} - {url}", r.status_code)
+        metrics.inc("crawl_http_requests_total", outcome="ok")
+        return r.text
+
+    def get(self, url: str, timeout: int = 15) -> str:
+        """Tải url (có chờ lượt theo host và thử lại); thời gian tính cả lúc chờ, ghi theo giai đoạn và theo domain."""
+        t0 = time.perf_counter()
+        try: return self._get(url, timeout)
+        finally:
+            dt = time.perf_counter() - t0
+            metrics.observe("crawl_stage_seconds", dt, stage="http_fetch")
+            metrics.observe_domain(canonical_domain(url), dt)
+
+    def _get(self, url: str, timeout: int) -> str:
+        # Phân giải trước: tên miền không tồn tại thì dừng ngay, không tốn request robots.txt
+        host = canonical_domain(url)
+        ip, dns_err = lookup_host(host) if host else ("", "")
+        if dns_err == "nxdomain":
+            metrics.inc("crawl_http_requests_total", outcome="dns")
+            raise PermanentFetchError(f"không phân giải được tên miền {host}")
+        if dns_err:
+            metrics.inc("crawl_http_requests_total", outcome="dns_transient")
+            raise TransientFetchError(f"lỗi DNS tạm thời khi phân giải {host}")
+        if self.respect_robots and not self._robots_for(url).can_fetch(self.HEADERS["User-Agent"], url):
+            metrics.inc("crawl_http_requests_total", outcome="robots")
+            raise RobotsDisallowed(f"robots.txt chặn {url}")
+        key = ip or host
+        for attempt in range(self.retries + 1):
+            try:
+                # Chờ lượt của host trước, chỉ giữ suất toàn cục trong lúc thực sự tải: luồng đang xếp hàng
+                # sau một host bận (hoặc đang ngủ host_delay) không chiếm suất của các host khác.
+                with self._host_slot(key):
+                    self._wait_turn(key)
+                    with self._total: return self._get_once(url, timeout)
+            except TransientFetchError as e:
+                if attempt >= self.retries: raise
+                metrics.inc("crawl_http_requests_total", outcome="retry")
+                backoff = min(30.0, 2.0 ** attempt * max(1.0, self.host_delay))
+                ra = getattr(e, "retry_after", None)
+                if ra and ra.isdigit(): backoff = min(60.0, max(backoff, float(ra)))
+                time.sleep(backoff)
+
+    def get_many(self, urls: list, timeout: int = 15):
+        """Tải song song nhiều URL; trả về iterator (url, html, lỗi) theo đúng thứ tự đầu vào."""
+        get = metrics.propagate(self.get)
+        futs = [(u, self._pool.submit(get, u, timeout)) for u in urls]
+        try:
+            for u, fut in futs:
+                try: yield u, fut.result(), None
+                except Exception as e: yield u, "", e
+        finally:
+            for _, fut in futs: fut.cancel()
+
+    @staticmethod
+    def order_by_host(items: list, url_of) -> list:
+        """Xếp việc xen kẽ giữa các domain để không dồn nhiều site cùng lúc vào một máy chủ.
+
+        Chỉ dùng canonical_domain, không phân giải DNS: việc xếp chạy trước khi tra DomainCache,
+        nên lần chạy lại toàn cache không tốn truy cập mạng nào. Giới hạn theo IP vẫn áp dụng lúc tải.
+        """
+        groups = {}
+        for it in items: groups.setdefault(canonical_domain(url_of(it)), []).append(it)
+        ordered, queues = [], [deque(q) for q in groups.values()]
+        while queues:
+            for q in queues: ordered.append(q.popleft())
+            queues = [q for q in queues if q]
+        return ordered
+
+HTTP = HttpEngine()
+
 def fetch_html(url: str, timeout: int = 15) -> str:
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"}
-    r = requests.get(url, headers=headers, timeout=timeout)
-    r.raise_for_status()
-    return r.text
-
-def extract_emails_from_html(html: str) -> list[str]:
-    html = re.sub(r"\s*\[\s*(at|AT)\s*\]\s*", "@", html)
-    html = re.sub(r"\s*\(\s*(at|AT)\s*\)\s*", "@", html)
-    html = re.sub(r"\s*\[\s*(dot|DOT)\s*\]\s*", ".", html)
-    html = re.sub(r"\s*\(\s*(dot|DOT)\s*\)\s*", ".", html)
-    emails = set(e.strip('.,') for e in EMAIL_RE.findall(html))
-    return sorted(list(emails), key=str.lower)
+    return HTTP.get(url, timeout=timeout)
 
 def _short(u: str) -> str:
     try: return urlparse(u).netloc
     except: return u[:30]
 
-def pick_contact_links_from_html(base_url: str, html: str, hints: list[str], limit=6):
-    soup = BeautifulSoup(html, "html.parser")
-    seen, out = set(), []
-    for a in soup.find_all("a", href=True):
-        href = a["href"].strip()
-        if not href or href.lower().startswith(("mailto:", "tel:")): continue
-        abs_u = requests.compat.urljoin(base_url, href)
-        if abs_u in seen: continue
-        text = (a.get_text(" ", strip=True) or "").lower()
-        if any(h in abs_u.lower() or h in text for h in hints):
-            out.append(abs_u); seen.add(abs_u)
-            if len(out) >= limit: return out
-    return out
-
-def selenium_emails_from_current_page(driver) -> list:
-    return extract_emails_from_html(driver.page_source or "")
+def selenium_emails_from_current_page(driver, blocklist=None) -> list:
+    return extract_emails_from_html(driver.page_source or "", blocklist)
 
 def request_phase_contact_only(base_url, hints, blocklist, on_status):
+    """Trả về (emails, nguồn, trạng thái, lý do).
+
+    trạng thái: ok | render (nên chuyển Selenium) | skip (không cần Selenium) | transient (thử lại sau) | robots.
+    """
     base = normalize_url(base_url)
     try:
         on_status(f"REQ: tải HOME {_short(base)}...")
         html0 = fetch_html(base)
+        pages, transient = [html0], False
         links = pick_contact_links_from_html(base, html0, hints)
         if not links:
-            on_status("REQ: không thấy link liên hệ."); return [], None
-        for u2 in links:
-            on_status(f"REQ CONTACT: {_short(u2)}...")
-            html = fetch_html(u2)
-            emails = [e for e in extract_emails_from_html(html) if not any(b in e.lower() for b in blocklist)]
-            if emails: return emails, f"Request CONTACT {_short(u2)}"
-        return [], None
+            on_status("REQ: không thấy link liên hệ.")
+        else:
+            on_status(f"REQ CONTACT: tải song song {len(links)} link ({_short(base)})...")
+            for u2, html, err in HTTP.get_many(links):
+                if err is not None:
+                    transient = transient or isinstance(err, TransientFetchError)
+                    on_status(f"REQ CONTACT: lỗi {_short(u2)} - {err}"); continue
+                emails = extract_emails_from_html(html, blocklist)
+                if emails: return emails, f"Request CONTACT {_short(u2)}", "ok", ""
+                pages.append(html)
+        # Email có thể nằm ngay trên HOME (footer) mà không cần render; chỉ khi HOME cũng không có mới tính lỗi tạm thời
+        emails = extract_emails_from_html(html0, blocklist)
+        if emails: return emails, f"Request HOME {_short(base)}", "ok", ""
+        if transient: return [], None, "transient", "lỗi tạm thời khi tải trang liên hệ"
+        render, reason = classify_escalation(pages)
+        if not links and not render: reason = "không có link liên hệ, " + reason
+        return [], None, "render" if render else "skip", reason
+    except RobotsDisallowed as e:
+        on_status(f"REQ: {e}"); return [], None, "robots", "robots.txt"
+    except TransientFetchError as e:
+        on_status(f"REQ: lỗi tạm thời - {e}"); return [], None, "transient", str(e)
+    except PermanentFetchError as e:
+        on_status(f"REQ: lỗi - {e}")
+        # 401/403/406: thường là chặn bot, trình duyệt thật có thể vượt qua; 404/410, DNS, SSL thì không
+        if e.status_code in (401, 403, 406, 999): return [], None, "render", f"bị chặn HTTP {e.status_code}"
+        return [], None, "skip", str(e)
     except Exception as e:
-        on_status(f"REQ: lỗi - {e}"); return [], None
+        on_status(f"REQ: lỗi - {e}"); return [], None, "render", f"lỗi không xác định: {e}"
+
+def wait_dom_ready(driver, timeout: float, settle: float = 0.0):
+    """Chờ document.readyState khác 'loading' (tối đa timeout giây), sau đó chờ thêm settle giây cho JS render."""
+    try: WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.execute_script("return document.readyState") != "loading")
+    except TimeoutException: pass
+    if settle > 0: time.sleep(settle)
 
-def selenium_phase_contact_then_home(driver, base_url, hints, blocklist, on_status, limit=4):
+def iter_rendered_tabs(driver, urls: list, timeout: float, settle: float = 0.0):
+    """Mở mỗi URL trong một tab riêng của cùng trình duyệt để chúng tải song song; yield (url, page_source) theo thứ tự.
+
+    Các tab được đóng và driver quay lại tab ban đầu khi duyệt xong hoặc khi bên gọi dừng sớm.
+    """
+    main, tabs = driver.current_window_handle, []
+    try:
+        for u in urls:
+            driver.switch_to.new_window("tab")
+            if getattr(driver, "block_resources", False): block_heavy_resources(driver)
+            # Gán location bằng JS để không chờ tab tải xong trước khi mở tab tiếp theo
+            driver.execute_script("window.location.href = arguments[0];", u)
+            tabs.append((u, driver.current_window_handle))
+        for u, h in tabs:
+            driver.switch_to.window(h)
+            wait_dom_ready(driver, timeout, settle)
+            yield u, driver.page_source or ""
+    finally:
+        for _, h in tabs:
+            try: driver.switch_to.window(h); driver.close()
+            except Exception: pass
+        try: driver.switch_to.window(main)
+        except Exception: pass
+
+def selenium_phase_contact_then_home(driver, base_url, hints, blocklist, on_status, limit=4, wait_body: float = 3, settle: float = 0.8):
+    """Render HOME một lần, mở các trang liên hệ song song trong tab, cuối cùng đọc lại HOME đã mở (không tải lại)."""
     base = normalize_url(base_url)
     try:
         on_status(f"SEL: mở HOME {_short(base)}...")
         driver.get(base)
-        time.sleep(1)
+        wait_dom_ready(driver, wait_body, settle)
         links = pick_contact_links_from_html(base, driver.page_source, hints, limit=limit)
-        for u2 in links:
-            on_status(f"SEL CONTACT: {_short(u2)}...")
-            driver.get(u2)
-            time.sleep(1)
-            emails = [e for e in selenium_emails_from_current_page(driver) if not any(b in e.lower() for b in blocklist)]
-            if emails: return emails, f"Selenium CONTACT {_short(u2)}"
-        on_status("SEL: không thấy @, quay lại HOME...")
-        driver.get(base)
-        time.sleep(1)
-        emails = [e for e in selenium_emails_from_current_page(driver) if not any(b in e.lower() for b in blocklist)]
+        if links:
+            on_status(f"SEL CONTACT: mở {len(links)} tab ({_short(base)})...")
+            for u2, html in iter_rendered_tabs(driver, links, wait_body, settle):
+                emails = extract_emails_from_html(html, blocklist)
+                if emails: return emails, f"Selenium CONTACT {_short(u2)}"
+        on_status("SEL: không thấy @, đọc lại HOME...")
+        # Tab HOME vẫn mở từ đầu và JS đã có thêm thời gian chạy trong lúc xử lý các tab liên hệ
+        emails = selenium_emails_from_current_page(driver, blocklist)
         if emails: return emails, "Selenium HOME"
         return [], None
     except Exception as e:
-        on_status(f"SEL: lỗi - {e}"); return [], None
\ No newline at end of file
+        on_status(f"SEL: lỗi - {e}"); raise
+
+def crawl_site_emails(url: str, cfg: dict, cache: DomainCache, pool: DriverPool = None, on_status=None) -> dict:
+    """Pha request -> (nếu cần) Selenium cho một site, có dùng DomainCache. Trả về các cột cần cập nhật cho dòng.
+
+    Ném TransientFetchError khi site lỗi tạm thời hoặc phiên Selenium lỗi (không ghi cache, để lần chạy sau thử lại).
+    pool=None: không bao giờ mở Selenium; site cần render khi đó cũng không được ghi cache.
+    """
+    on_status = on_status or (lambda msg: None)
+    with metrics.timed("site"):
+        return _crawl_site_emails(url, cfg, cache, pool, on_status)
+
+def _crawl_site_emails(url, cfg, cache, pool, on_status) -> dict:
+    domain = canonical_domain(url)
+    with cache.claim(domain) as cached:
+        metrics.inc("crawl_cache_total", result="hit" if cached else "miss")
+        if cached:
+            metrics.inc("crawl_sites_total", outcome="cache")
+            if cached["emails"]:
+                return {"Email": "; ".join(cached["emails"]), "Trạng thái": f"Từ cache ({cached.get('source') or 'NA'})"}
+            return {"Trạng thái": "Không tìm thấy email (cache)"}
+
+        out = {}
+        with metrics.timed("request_phase"):
+            emails, source, req_status, reason = request_phase_contact_only(url, cfg['contact_hints'], cfg['blocklist'], on_status)
+        if req_status == "transient":
+            # Không mở Selenium và không ghi cache: dòng được đánh dấu lỗi để lần resume sau thử lại
+            metrics.inc("crawl_sites_total", outcome="transient")
+            raise TransientFetchError(f"lỗi tạm thời khi tải {domain}, sẽ thử lại sau")
+        if req_status == "robots":
+            metrics.inc("crawl_sites_total", outcome="robots")
+            return {"Trạng thái": "Bị chặn bởi robots.txt"}
+        # Chỉ mở Chrome khi HTML cho thấy trang cần render (hoặc khi tắt smart_escalation)
+        needs = not emails and (req_status == "render" or not cfg['smart_escalation'])
+        escalate = needs and pool is not None
+        if not emails:
+            out['Selenium'] = f"{'Có' if escalate else 'Cần (không có driver)' if needs else 'Không'}: {reason}"
+            on_status(f"REQ → {'SEL' if escalate else 'bỏ qua Selenium'} ({domain}): {reason}")
+        if escalate:
+            try:
+                with metrics.timed("selenium_phase"), pool.driver() as driver:
+                    emails, source = selenium_phase_contact_then_home(
+                        driver, url, cfg['contact_hints'], cfg['blocklist'], on_status,
+                        limit=cfg['selenium_contact_limit'], wait_body=cfg['selenium_wait_body'], settle=cfg['selenium_sleep_per_page'])
+            except Exception as e:
+                # Phiên Selenium lỗi: domain không bị ghi cache rỗng, lần chạy sau thử lại
+                metrics.inc("crawl_selenium_total", outcome="error"); metrics.inc("crawl_sites_total", outcome="transient")
+                raise TransientFetchError(f"Selenium lỗi khi mở {domain}: {e}") from e
+            metrics.inc("crawl_selenium_total", outcome="email" if emails else "none")
+        if emails:
+            out['Email'] = "; ".join(emails)
+            out['Trạng thái'] = f"OK - {source}"
+            metrics.inc("crawl_sites_total", outcome="selenium_email" if escalate else "request_email")
+            cache.put(domain, emails, source, "ok")
+        else:
+            out['Trạng thái'] = "Không tìm thấy email"
+            metrics.inc("crawl_sites_total", outcome="needs_render" if needs and not escalate else "no_email")
+            # Trang cần render mà chưa có Chrome: chưa phải kết quả cuối, để lần chạy có driver xử lý
+            if not (needs and not escalate): cache.put(domain, [], None, "none")
+        return out
@@ -0,0 +1,83 @@
+# domain_cache.py
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# ==================================================
+# CACHE KẾT QUẢ EMAIL THEO DOMAIN (SQLite), DÙNG LẠI GIỮA CÁC LẦN CHẠY
+# ==================================================
+# - domains: emails/nguồn/trạng thái của lần crawl gần nhất cho mỗi canonical_domain
+# - claims : quyền crawl domain đang được giữ (lease), dùng chung giữa các tiến trình mở cùng file
+
+class DomainCache:
+    """Cache kết quả theo canonical_domain lưu trong SQLite, dùng lại giữa các lần chạy.
+
+    Kết quả có email hết hạn sau ttl_hours, kết quả rỗng sau negative_ttl_hours.
+    claim() đảm bảo mỗi domain chỉ có một luồng đang crawl tại một thời điểm, kể cả giữa các tiến trình
+    dùng chung file: quyền crawl là một dòng lease trong bảng claims.
+    """
+    FILE = "domain_cache.sqlite3"
+    CLAIM_SECONDS = 900  # lease quyền crawl; tiến trình chết giữa chừng thì domain được nhả sau chừng này
+    CLAIM_POLL = 0.5
+
+    def __init__(self, path: str = None, ttl_hours: float = 720, negative_ttl_hours: float = 72):
+        self.ttl, self.negative_ttl = ttl_hours * 3600, negative_ttl_hours * 3600
+        self._db = sqlite3.connect(path or self.FILE, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS domains (
+            domain TEXT PRIMARY KEY, emails TEXT NOT NULL, source TEXT, status TEXT NOT NULL, fetched_at REAL NOT NULL)""")
+        self._db.execute("CREATE TABLE IF NOT EXISTS claims (domain TEXT PRIMARY KEY, owner TEXT NOT NULL, until REAL NOT NULL)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._inflight = {}  # domain -> [lock, số luồng đang chờ/giữ]
+
+    def get(self, domain: str):
+        with self._lock:
+            r = self._db.execute("SELECT emails, source, status, fetched_at FROM domains WHERE domain = ?", (domain,)).fetchone()
+        if not r: return None
+        emails, source, status, fetched_at = json.loads(r[0]), r[1], r[2], r[3]
+        if time.time() - fetched_at > (self.ttl if emails else self.negative_ttl): return None
+        return {"emails": emails, "source": source, "status": status, "fetched_at": fetched_at}
+
+    def put(self, domain: str, emails: list, source: str, status: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO domains (domain, emails, source, status, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                             (domain, json.dumps(emails, ensure_ascii=False), source, status, time.time()))
+            self._db.commit()
+
+    def _try_claim(self, domain: str, owner: str) -> bool:
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute("""INSERT INTO claims (domain, owner, until) VALUES (?, ?, ?)
+                                      ON CONFLICT (domain) DO UPDATE SET owner = excluded.owner, until = excluded.until
+                                      WHERE claims.until < ?""", (domain, owner, now + self.CLAIM_SECONDS, now))
+            self._db.commit()
+        return cur.rowcount == 1
+
+    def _release(self, domain: str, owner: str):
+        with self._lock:
+            self._db.execute("DELETE FROM claims WHERE domain = ? AND owner = ?", (domain, owner))
+            self._db.commit()
+
+    @contextmanager
+    def claim(self, domain: str):
+        """Giữ quyền crawl domain; trả về bản cache còn hạn (nếu có) sau khi luồng/tiến trình crawl trước đó xong."""
+        with self._lock:
+            slot = self._inflight.setdefault(domain, [threading.Lock(), 0]); slot[1] += 1
+        try:
+            # Trong tiến trình: khoá theo domain (không tốn truy vấn SQLite khi chờ); giữa các tiến trình: lease trong bảng claims
+            with slot[0]:
+                owner = uuid.uuid4().hex
+                while not self._try_claim(domain, owner): time.sleep(self.CLAIM_POLL)
+                try: yield self.get(domain)
+                finally: self._release(domain, owner)
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0: self._inflight.pop(domain, None)
+
+    def close(self):
+        with self._lock: self._db.close()
@@ -0,0 +1,121 @@
+# event_hub.py
+import json
+import threading
+import time
+import uuid
+from collections import deque, OrderedDict
+
+# ==================================================
+# KÊNH SỰ KIỆN THEO JOB (PUB/SUB) CHO SSE
+# ==================================================
+# Mỗi job có một kênh riêng với bộ đệm vòng giới hạn: worker publish không bao giờ bị chặn,
+# nhiều trình duyệt có thể cùng đọc một kênh, và khi kết nối lại thì đọc tiếp từ id sự kiện cuối
+# (Last-Event-ID, dạng "<epoch>-<seq>"). Người đọc quá chậm sẽ bị bỏ qua các sự kiện cũ nhất và được báo số sự kiện bị mất.
+
+class JobChannel:
+    def __init__(self, job_id: str, maxlen: int = 5000):
+        self.job_id = job_id
+        self._buf = deque(maxlen=maxlen)
+        self._seq = 0
+        # Mỗi kênh (mỗi lần chạy job) có epoch riêng: id sự kiện của kênh cũ không dùng được cho kênh mới
+        self.epoch = uuid.uuid4().hex[:8]
+        self._cond = threading.Condition()
+        self.closed = False
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def publish(self, type_: str, **data):
+        with self._cond:
+            self._seq += 1
+            self._buf.append((self._seq, dict(data, type=type_)))
+            self._cond.notify_all()
+
+    def log(self, msg: str):
+        self.publish("log", msg=msg)
+
+    def close(self, **data):
+        """Gửi sự kiện 'complete' và đánh dấu kênh đã đóng (vẫn giữ bộ đệm để phát lại)."""
+        self.publish("complete", **data)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def resume_seq(self, event_id: str) -> int:
+        """seq để đọc tiếp từ Last-Event-ID; id của kênh khác (job chạy lại, app khởi động lại) -> đọc lại từ đầu."""
+        epoch, _, seq = (event_id or "").rpartition("-")
+        try: seq = int(seq)
+        except ValueError: return 0
+        if (epoch and epoch != self.epoch) or not 0 <= seq <= self._seq: return 0
+        return seq
+
+    def read(self, after_seq: int, timeout: float = 15.0):
+        """Chờ tới khi có sự kiện mới hơn after_seq. Trả về (danh sách (seq, event), số sự kiện bị mất, kênh đã đóng)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq or self.closed, timeout)
+            events = [e for e in self._buf if e[0] > after_seq]
+            dropped = max(0, events[0][0] - after_seq - 1) if events else 0
+            return events, dropped, self.closed
+
+def coalesce(events: list) -> list:
+    """Gộp một loạt sự kiện thành một khung: giữ mọi log, chỉ giữ 'progress' mới nhất và bản mới nhất của mỗi dòng."""
+    out, progress, rows = [], None, OrderedDict()
+    for _, ev in events:
+        t = ev["type"]
+        if t == "progress": progress = ev
+        elif t == "row": rows[ev.get("idx")] = ev; rows.move_to_end(ev.get("idx"))
+        else: out.append(ev)
+    out.extend(rows.values())
+    if progress: out.append(progress)
+    # 'complete' luôn đứng cuối khung
+    out.sort(key=lambda ev: ev["type"] == "complete")
+    return out
+
+class EventHub:
+    """Giữ kênh của các job gần nhất (đã xong thì vẫn giữ để phát lại cho tới khi bị đẩy ra; kênh đang mở thì luôn giữ)."""
+
+    def __init__(self, max_channels: int = 50, maxlen: int = 5000):
+        self.max_channels, self.maxlen = max_channels, maxlen
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def channel(self, job_id: str) -> JobChannel:
+        with self._lock:
+            ch = self._channels.get(job_id)
+            if ch is None:
+                ch = self._channels[job_id] = JobChannel(job_id, self.maxlen)
+                # Chỉ bỏ kênh đã đóng, cũ nhất trước. Kênh của job đang chạy không bao giờ bị bỏ (worker vẫn publish vào nó),
+                # nên khi mọi kênh đều đang mở thì hub tạm vượt max_channels.
+                extra = len(self._channels) - self.max_channels
+                if extra > 0:
+                    for k in [k for k, c in self._channels.items() if c.closed][:extra]: self._channels.pop(k)
+            return ch
+
+    def open(self, job_id: str) -> JobChannel:
+        """Kênh cho một lần chạy mới của job: nếu kênh cũ đã đóng (job chạy lại) thì thay bằng kênh mới."""
+        with self._lock:
+            ch = self._channels.get(job_id)
+            if ch is not None and ch.closed: self._channels.pop(job_id)
+        return self.channel(job_id)
+
+    def get(self, job_id: str):
+        with self._lock: return self._channels.get(job_id)
+
+def sse_frames(channel: JobChannel, last_seq: int = 0, batch_window: float = 0.25, keepalive: float = 15.0):
+    """Generator các khung SSE: mỗi khung chứa mọi sự kiện đã gộp kể từ khung trước."""
+    while True:
+        events, dropped, closed = channel.read(last_seq, keepalive)
+        if not events:
+            if closed: return
+            yield ": keepalive\n\n"; continue
+        last_seq = events[-1][0]
+        batch = coalesce(events)
+        if dropped: batch.insert(0, {"type": "dropped", "count": dropped})
+        yield f"id: {channel.event_id(last_seq)}\ndata: {json.dumps(batch, ensure_ascii=False)}\n\n"
+        if closed and last_seq >= channel.last_seq: return
+        # Chờ một nhịp để sự kiện tiếp theo được gom vào cùng một khung
+        time.sleep(batch_window)
@@ -0,0 +1,109 @@
+# exporter.py
+import csv
+import io
+import json
+import os
+import tempfile
+
+# ==================================================
+# XUẤT KẾT QUẢ THEO LUỒNG (XLSX / CSV / JSONL / PARQUET)
+# ==================================================
+# Các dòng được đọc từng khối từ JobStore và ghi dần: CSV/JSONL stream thẳng ra response,
+# XLSX (openpyxl write-only) và Parquet (pyarrow, tuỳ chọn) ghi ra file tạm rồi stream file đó.
+# Không lúc nào giữ toàn bộ kết quả trong bộ nhớ.
+
+EXPORT_COLUMNS = ["Từ khóa", "Tên", "Địa chỉ", "Điện thoại", "Danh mục", "Trang web", "Email", "Trạng thái", "Selenium"]
+FORMATS = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl": ("application/x-ndjson; charset=utf-8", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+CHUNK_ROWS = 1000
+FILE_CHUNK = 64 * 1024
+
+def select_columns(requested) -> list:
+    """Giữ thứ tự cột theo yêu cầu (cột dòng không có thì để trống). Không chọn gì -> cột mặc định."""
+    cols = [c for c in (requested or []) if c]
+    return cols or list(EXPORT_COLUMNS)
+
+def filter_rows(rows, status: str = None, keyword: str = None):
+    """Lọc theo chuỗi con của 'Trạng thái' và 'Từ khóa' (không phân biệt hoa thường)."""
+    status, keyword = (status or "").lower(), (keyword or "").lower()
+    for row in rows:
+        if status and status not in str(row.get("Trạng thái", "")).lower(): continue
+        if keyword and keyword not in str(row.get("Từ khóa", "")).lower(): continue
+        yield row
+
+def _values(row: dict, cols: list) -> list:
+    return [row.get(c, "") for c in cols]
+
+def iter_csv(rows, cols: list):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")  # BOM để Excel đọc đúng tiếng Việt
+    writer.writerow(cols)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(_values(row, cols))
+        if n % CHUNK_ROWS == 0:
+            yield buf.getvalue(); buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+def iter_jsonl(rows, cols: list):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({c: row.get(c, "") for c in cols}, ensure_ascii=False))
+        if len(lines) >= CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"; lines = []
+    if lines: yield "\n".join(lines) + "\n"
+
+def write_xlsx(rows, cols: list, path: str):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(cols)
+    for row in rows: ws.append(["" if v is None else v for v in _values(row, cols)])
+    wb.save(path)
+
+def write_parquet(rows, cols: list, path: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(c, pa.string()) for c in cols])
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        def flush():
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        for row in rows:
+            batch.append({c: str(row.get(c, "")) for c in cols})
+            if len(batch) >= CHUNK_ROWS * 5:
+                flush(); batch = []
+        if batch: flush()
+
+def iter_file_export(writer, rows, cols: list, suffix: str):
+    """Ghi ra file tạm bằng writer rồi stream file theo khối; file tạm bị xoá khi stream xong hoặc bị huỷ."""
+    fd, path = tempfile.mkstemp(suffix="." + suffix)
+    os.close(fd)
+    try:
+        writer(rows, cols, path)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(FILE_CHUNK)
+                if not chunk: return
+                yield chunk
+    finally:
+        try: os.remove(path)
+        except OSError: pass
+
+def export_stream(fmt: str, rows, cols: list):
+    """Trả về generator các khối dữ liệu (str hoặc bytes) cho định dạng fmt."""
+    if fmt == "csv": return iter_csv(rows, cols)
+    if fmt == "jsonl": return iter_jsonl(rows, cols)
+    if fmt == "xlsx": return iter_file_export(write_xlsx, rows, cols, "xlsx")
+    if fmt == "parquet": return iter_file_export(write_parquet, rows, cols, "parquet")
+    raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError: return False
@@ -0,0 +1,125 @@
+# job_store.py
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+# ==================================================
+# LƯU TÁC VỤ & KẾT QUẢ (SQLite), CHO PHÉP CHẠY TIẾP SAU KHI KHỞI ĐỘNG LẠI
+# ==================================================
+# - jobs : mỗi lần harvest / lấy email là một job (kind, status, params, parent_id)
+# - rows : các dòng kết quả của một job harvest, ghi dần khi có kết quả
+# - tasks: điểm kiểm tra của từng đơn vị việc (truy vấn Maps hoặc chỉ số dòng) -> 'pending' | 'done' | 'error'
+
+class JobStore:
+    FILE = "jobs.sqlite3"
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL,
+        parent_id TEXT, summary TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL);
+    CREATE TABLE IF NOT EXISTS rows (
+        job_id TEXT NOT NULL, idx INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (job_id, idx));
+    CREATE TABLE IF NOT EXISTS tasks (
+        job_id TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, info TEXT, updated_at REAL NOT NULL,
+        PRIMARY KEY (job_id, key));
+    """
+
+    def __init__(self, path: str = None):
+        self._db = sqlite3.connect(path or self.FILE, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(self.SCHEMA)
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def _exec(self, sql: str, args=(), many: bool = False):
+        with self._lock:
+            cur = self._db.executemany(sql, args) if many else self._db.execute(sql, args)
+            self._db.commit()
+            return cur
+
+    def _query(self, sql: str, args=()):
+        with self._lock: return self._db.execute(sql, args).fetchall()
+
+    # --- jobs ---
+    def create_job(self, kind: str, params: dict, parent_id: str = None) -> str:
+        job_id, now = uuid.uuid4().hex[:12], time.time()
+        self._exec("INSERT INTO jobs (id, kind, status, params, parent_id, created_at, updated_at) VALUES (?, ?, 'running', ?, ?, ?, ?)",
+                   (job_id, kind, json.dumps(params, ensure_ascii=False), parent_id, now, now))
+        return job_id
+
+    def set_job_status(self, job_id: str, status: str, summary: dict = None):
+        if summary is None:
+            self._exec("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+        else:
+            self._exec("UPDATE jobs SET status = ?, summary = ?, updated_at = ? WHERE id = ?",
+                       (status, json.dumps(summary, ensure_ascii=False), time.time(), job_id))
+
+    @staticmethod
+    def _job_dict(r) -> dict:
+        return {"id": r[0], "kind": r[1], "status": r[2], "params": json.loads(r[3]), "parent_id": r[4],
+                "summary": json.loads(r[5]) if r[5] else None, "created_at": r[6], "updated_at": r[7]}
+
+    def get_job(self, job_id: str):
+        r = self._query("SELECT id, kind, status, params, parent_id, summary, created_at, updated_at FROM jobs WHERE id = ?", (job_id,))
+        return self._job_dict(r[0]) if r else None
+
+    def list_jobs(self, limit: int = 50) -> list:
+        rs = self._query("SELECT id, kind, status, params, parent_id, summary, created_at, updated_at FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [self._job_dict(r) for r in rs]
+
+    def latest_job(self, kind: str = "harvest"):
+        r = self._query("SELECT id FROM jobs WHERE kind = ? ORDER BY created_at DESC LIMIT 1", (kind,))
+        return r[0][0] if r else None
+
+    def interrupt_running(self) -> list:
+        """Gọi khi khởi động: job còn 'running' là job bị dừng giữa chừng do tiến trình chết."""
+        ids = [r[0] for r in self._query("SELECT id FROM jobs WHERE status = 'running'")]
+        self._exec("UPDATE jobs SET status = 'interrupted', updated_at = ? WHERE status = 'running'", (time.time(),))
+        return ids
+
+    # --- rows ---
+    def add_row(self, job_id: str, row: dict) -> int:
+        with self._lock:
+            idx = self._db.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM rows WHERE job_id = ?", (job_id,)).fetchone()[0]
+            self._db.execute("INSERT INTO rows (job_id, idx, data) VALUES (?, ?, ?)", (job_id, idx, json.dumps(row, ensure_ascii=False)))
+            self._db.commit()
+        return idx
+
+    def update_row(self, job_id: str, idx: int, row: dict):
+        self._exec("UPDATE rows SET data = ? WHERE job_id = ? AND idx = ?", (json.dumps(row, ensure_ascii=False), job_id, idx))
+
+    def get_row(self, job_id: str, idx: int):
+        r = self._query("SELECT data FROM rows WHERE job_id = ? AND idx = ?", (job_id, idx))
+        return json.loads(r[0][0]) if r else None
+
+    def iter_rows(self, job_id: str, chunk: int = 1000):
+        """Yield (idx, row) theo thứ tự, đọc từng khối để không nạp cả bảng vào bộ nhớ."""
+        last = -1
+        while True:
+            rs = self._query("SELECT idx, data FROM rows WHERE job_id = ? AND idx > ? ORDER BY idx LIMIT ?", (job_id, last, chunk))
+            if not rs: return
+            for idx, data in rs: yield idx, json.loads(data)
+            last = rs[-1][0]
+
+    def get_rows(self, job_id: str) -> list:
+        return [row for _, row in self.iter_rows(job_id)]
+
+    def count_rows(self, job_id: str) -> int:
+        return self._query("SELECT COUNT(*) FROM rows WHERE job_id = ?", (job_id,))[0][0]
+
+    # --- tasks ---
+    def add_tasks(self, job_id: str, keys):
+        now = time.time()
+        self._exec("INSERT OR IGNORE INTO tasks (job_id, key, state, updated_at) VALUES (?, ?, 'pending', ?)",
+                   [(job_id, k, now) for k in keys], many=True)
+
+    def set_task(self, job_id: str, key: str, state: str, info: str = None):
+        self._exec("UPDATE tasks SET state = ?, info = ?, updated_at = ? WHERE job_id = ? AND key = ?",
+                   (state, info, time.time(), job_id, key))
+
+    def unfinished_tasks(self, job_id: str) -> list:
+        return [r[0] for r in self._query("SELECT key FROM tasks WHERE job_id = ? AND state != 'done' ORDER BY rowid", (job_id,))]
+
+    def task_counts(self, job_id: str) -> dict:
+        return dict(self._query("SELECT state, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY state", (job_id,)))
@@ -0,0 +1,217 @@
+# metrics.py
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# ==================================================
+# SỐ LIỆU THEO GIAI ĐOẠN (COUNTER / GAUGE / HISTOGRAM)
+# ==================================================
+# - REGISTRY: số liệu của cả tiến trình, xuất dạng Prometheus ở /metrics.
+# - Mỗi job có thể gắn thêm một Registry riêng cho luồng đang chạy (bind); số liệu ghi trong luồng đó
+#   vào cả REGISTRY lẫn registry của job -> tóm tắt theo job. Việc chuyển sang luồng khác (executor)
+#   phải bọc bằng propagate() để mang theo registry của job.
+# - Tiến trình con (harvest) gửi snapshot() về tiến trình cha qua queue, cha gọi merge().
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+HELP = {
+    "crawl_stage_seconds": "Thời gian mỗi giai đoạn (driver_start, scroll_round, extract, http_fetch, request_phase, selenium_phase, site, harvest_query)",
+    "crawl_http_requests_total": "Số request HTTP theo kết quả",
+    "crawl_sites_total": "Số site đã xử lý theo kết quả",
+    "crawl_cache_total": "Số lần tra DomainCache theo kết quả (hit/miss)",
+    "crawl_selenium_total": "Số lần chạy pha Selenium theo kết quả",
+    "crawl_rows_total": "Số dòng địa điểm trích xuất được (trước khi loại trùng giữa các truy vấn)",
+    "crawl_search_bodies_total": "Số response 'search?' đã đọc",
+    "crawl_drivers_total": "Số lần khởi động / huỷ Chrome",
+    "crawl_drivers_active": "Số Chrome đang mở trong tiến trình",
+    "crawl_domain_seconds": "Thời gian tải trang theo domain (các domain chậm nhất)",
+}
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts, self.count, self.sum, self.max = [0] * (len(BUCKETS) + 1), 0, 0.0, 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(BUCKETS, v)] += 1
+        self.count += 1; self.sum += v; self.max = max(self.max, v)
+
+    def merge(self, counts, count, total, vmax):
+        for i, c in enumerate(counts): self.counts[i] += c
+        self.count += count; self.sum += total; self.max = max(self.max, vmax)
+
+    def quantile(self, q: float) -> float:
+        """Ước lượng phân vị từ bucket (cận trên của bucket chứa phân vị; bucket cuối dùng giá trị lớn nhất)."""
+        if not self.count: return 0.0
+        rank, acc = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank: return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+class Registry:
+    def __init__(self, max_domains: int = 2000):
+        self._lock = threading.Lock()
+        self.counters, self.gauges, self.hists = {}, {}, {}
+        self.domains = OrderedDict()  # domain -> Histogram, giữ tối đa max_domains domain dùng gần nhất
+        self.max_domains = max_domains
+        self.started = time.time()
+
+    def inc(self, name: str, n: float = 1, **labels):
+        k = _key(name, labels)
+        with self._lock: self.counters[k] = self.counters.get(k, 0) + n
+
+    def add_gauge(self, name: str, delta: float, **labels):
+        k = _key(name, labels)
+        with self._lock: self.gauges[k] = self.gauges.get(k, 0) + delta
+
+    def observe(self, name: str, value: float, **labels):
+        k = _key(name, labels)
+        with self._lock:
+            h = self.hists.get(k)
+            if h is None: h = self.hists[k] = Histogram()
+            h.observe(value)
+
+    def observe_domain(self, domain: str, seconds: float):
+        with self._lock:
+            h = self.domains.pop(domain, None) or Histogram()
+            h.observe(seconds); self.domains[domain] = h
+            while len(self.domains) > self.max_domains: self.domains.popitem(last=False)
+
+    # --- chuyển giữa tiến trình ---
+    def snapshot(self, reset: bool = False) -> dict:
+        """Dạng picklable/JSON của counter, histogram và số liệu domain (không gồm gauge, vốn chỉ có nghĩa trong tiến trình)."""
+        with self._lock:
+            snap = {"counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                    "hists": [[n, list(l), h.counts, h.count, h.sum, h.max] for (n, l), h in self.hists.items()],
+                    "domains": [[d, h.counts, h.count, h.sum, h.max] for d, h in self.domains.items()]}
+            if reset: self.counters, self.hists, self.domains = {}, {}, OrderedDict()
+        return snap
+
+    def merge(self, snap: dict):
+        with self._lock:
+            for n, l, v in snap.get("counters", []):
+                k = (n, tuple(tuple(x) for x in l)); self.counters[k] = self.counters.get(k, 0) + v
+            for n, l, counts, count, total, vmax in snap.get("hists", []):
+                k = (n, tuple(tuple(x) for x in l))
+                h = self.hists.get(k)
+                if h is None: h = self.hists[k] = Histogram()
+                h.merge(counts, count, total, vmax)
+            for d, counts, count, total, vmax in snap.get("domains", []):
+                h = self.domains.pop(d, None) or Histogram()
+                h.merge(counts, count, total, vmax); self.domains[d] = h
+            while len(self.domains) > self.max_domains: self.domains.popitem(last=False)
+
+    # --- xuất ---
+    def slowest_domains(self, n: int = 10) -> list:
+        with self._lock: items = list(self.domains.items())
+        items.sort(key=lambda kv: kv[1].sum, reverse=True)
+        return [{"domain": d, "requests": h.count, "total_s": round(h.sum, 3), "avg_ms": round(h.sum / h.count * 1000, 1),
+                 "max_ms": round(h.max * 1000, 1)} for d, h in items[:n]]
+
+    def summary(self) -> dict:
+        """Tóm tắt gọn cho một job: thời gian từng giai đoạn, các counter, domain chậm nhất."""
+        with self._lock:
+            stages = {}
+            for (n, l), h in self.hists.items():
+                if n != "crawl_stage_seconds" or not h.count: continue
+                stages[dict(l).get("stage", "?")] = {
+                    "count": h.count, "total_s": round(h.sum, 3), "avg_ms": round(h.sum / h.count * 1000, 1),
+                    "p50_ms": round(h.quantile(0.5) * 1000, 1), "p95_ms": round(h.quantile(0.95) * 1000, 1),
+                    "max_ms": round(h.max * 1000, 1)}
+            counters = {}
+            for (n, l), v in sorted(self.counters.items()):
+                counters[n + ("{" + ",".join(f"{a}={b}" for a, b in l) + "}" if l else "")] = v
+            elapsed = time.time() - self.started
+        hits, misses = counters.get("crawl_cache_total{result=hit}", 0), counters.get("crawl_cache_total{result=miss}", 0)
+        return {"elapsed_s": round(elapsed, 1), "stages": stages, "counters": counters,
+                "cache_hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+                "slowest_domains": self.slowest_domains()}
+
+    def render_prometheus(self, top_domains: int = 20) -> str:
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items: return ""
+            esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return "{" + ",".join(f'{a}="{esc(b)}"' for a, b in items) + "}"
+        with self._lock:
+            counters, gauges = sorted(self.counters.items()), sorted(self.gauges.items())
+            hists = sorted((k, (list(h.counts), h.count, h.sum)) for k, h in self.hists.items())
+        out, typed = [], set()
+        def head(name, kind):
+            if name in typed: return
+            typed.add(name)
+            if name in HELP: out.append(f"# HELP {name} {HELP[name]}")
+            out.append(f"# TYPE {name} {kind}")
+        for (n, l), v in counters:
+            head(n, "counter"); out.append(f"{n}{fmt(l)} {v}")
+        for (n, l), v in gauges:
+            head(n, "gauge"); out.append(f"{n}{fmt(l)} {v}")
+        for (n, l), (counts, count, total) in hists:
+            head(n, "histogram")
+            acc = 0
+            for b, c in zip(BUCKETS, counts):
+                acc += c; out.append(f"{n}_bucket{fmt(l, [('le', b)])} {acc}")
+            out.append(f"{n}_bucket{fmt(l, [('le', '+Inf')])} {count}")
+            out.append(f"{n}_sum{fmt(l)} {round(total, 6)}")
+            out.append(f"{n}_count{fmt(l)} {count}")
+        # Không gắn nhãn domain cho mọi domain (quá nhiều chuỗi thời gian): chỉ các domain tốn thời gian nhất
+        slow = self.slowest_domains(top_domains)
+        if slow:
+            head("crawl_domain_seconds", "summary")
+            for d in slow:
+                out.append(f"crawl_domain_seconds_sum{fmt([('domain', d['domain'])])} {d['total_s']}")
+                out.append(f"crawl_domain_seconds_count{fmt([('domain', d['domain'])])} {d['requests']}")
+        return "\n".join(out) + "\n"
+
+REGISTRY = Registry()
+_local = threading.local()
+
+def _targets():
+    return (REGISTRY,) + getattr(_local, "extra", ())
+
+@contextmanager
+def bind(registry: Registry):
+    """Ghi thêm số liệu của luồng hiện tại vào registry (thường là registry của một job)."""
+    prev = getattr(_local, "extra", ())
+    _local.extra = prev + (registry,)
+    try: yield registry
+    finally: _local.extra = prev
+
+def propagate(fn):
+    """Bọc fn để khi chạy ở luồng khác (executor) vẫn ghi vào các registry đang gắn với luồng gọi."""
+    extra = getattr(_local, "extra", ())
+    if not extra: return fn
+    def wrapper(*args, **kwargs):
+        prev = getattr(_local, "extra", ())
+        _local.extra = extra
+        try: return fn(*args, **kwargs)
+        finally: _local.extra = prev
+    return wrapper
+
+def inc(name: str, n: float = 1, **labels):
+    for r in _targets(): r.inc(name, n, **labels)
+
+def observe(name: str, value: float, **labels):
+    for r in _targets(): r.observe(name, value, **labels)
+
+def observe_domain(domain: str, seconds: float):
+    for r in _targets(): r.observe_domain(domain, seconds)
+
+def add_gauge(name: str, delta: float, **labels):
+    REGISTRY.add_gauge(name, delta, **labels)
+
+def merge(snap: dict):
+    for r in _targets(): r.merge(snap)
+
+@contextmanager
+def timed(stage: str, **labels):
+    """Đo thời gian khối lệnh vào crawl_stage_seconds{stage=...}, kể cả khi khối lệnh ném lỗi."""
+    t0 = time.perf_counter()
+    try: yield
+    finally: observe("crawl_stage_seconds", time.perf_counter() - t0, stage=stage, **labels)
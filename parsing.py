@@ -0,0 +1,335 @@
+# parsing.py
+# Phân tích dữ liệu thuần Python (không cần selenium/requests), dùng chung cho crawler_logic và test
+import json
+import re
+import bisect
+import html as html_lib
+from functools import lru_cache
+from urllib.parse import unquote, urljoin
+
+# ==================================================
+# DỌN DẸP RESPONSE GOOGLE MAPS
+# ==================================================
+def clean_google_maps_body(raw: str):
+    if raw is None: return None, ""
+    s = raw.strip()
+    if s.endswith('/*""*/'): s = s[:-6].rstrip()
+    def try_parse_json(txt: str):
+        try: return json.loads(txt)
+        except Exception: return None
+    if s.startswith(")]}'\n"):
+        s2 = s[5:].lstrip(); obj = try_parse_json(s2)
+        return (obj, s2) if obj is not None else (None, s2)
+    if s.startswith(")]}'"):
+        nl = s.find("\n"); s2 = s[nl + 1:] if nl != -1 else s[4:]
+        obj = try_parse_json(s2)
+        return (obj, s2) if obj is not None else (None, s2)
+    obj = try_parse_json(s)
+    if obj is not None:
+        if isinstance(obj, dict) and isinstance(obj.get("d"), str):
+            inner = obj["d"].lstrip()
+            if inner.startswith(")]}'\n"): inner = inner[5:].lstrip()
+            elif inner.startswith(")]}'"):
+                nl = inner.find("\n"); inner = inner[nl + 1:] if nl != -1 else inner[4:]
+            obj2 = try_parse_json(inner)
+            return (obj2, inner) if obj2 is not None else (None, inner)
+        return obj, s
+    return None, s
+
+# ===========================================================
+# TRÍCH XUẤT THÔNG TIN (VIẾT LẠI CHÍNH XÁC NHƯ BẢN GỐC)
+# ===========================================================
+BUSINESS_RE = re.compile(r'\[\s*null\s*,\s*null\s*,\s*(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)\s*\]\s*,\s*"(?:[^"]+)"\s*,\s*"([^"]+)"')
+STRING_LITERAL_RE = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"')
+NON_BUSINESS_HOSTS = ("google.com", "gstatic.com", "ggpht.com", "googleusercontent.com", "/maps")
+NAME_TOKEN_RE = re.compile(r"[a-zA-Z0-9]+")
+
+def _is_business_url(u: str) -> bool:
+    u2 = u.lower()
+    return not any(b in u2 for b in NON_BUSINESS_HOSTS)
+
+def _pick_website(cands, name: str, pos: int) -> str:
+    """cands: [(vị trí, url)] theo thứ tự xuất hiện. Gần tên nhất, chứa token của tên, không có query được ưu tiên."""
+    tokens = [t for t in NAME_TOKEN_RE.findall(name.lower()) if len(t) >= 3]
+    best_url, best_score, first_pos = "", float("-inf"), {}
+    for p, u in cands:
+        # Khoảng cách tính từ lần xuất hiện đầu tiên của url trong cửa sổ
+        score = -abs(first_pos.setdefault(u, p) - pos)
+        if any(t in u.lower() for t in tokens): score += 2000
+        if u.count("?") == 0: score += 100
+        if score > best_score: best_score, best_url = score, u
+    return best_url
+
+class PayloadIndex:
+    """Chỉ mục một lần duyệt trên payload Maps: vị trí các URL doanh nghiệp và chuỗi địa chỉ "Tên, ..." theo tiền tố.
+
+    Sau khi dựng (O(kích thước text)), tra địa chỉ là O(1) và tra website chỉ xét các URL trong cửa sổ quanh vị trí tên.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._url_pos, self._urls = [], []
+        self._addresses = {}
+        for m in STRING_LITERAL_RE.finditer(text):
+            lit = m.group(1)
+            if lit.startswith(("http://", "https://")):
+                if _is_business_url(lit): self._url_pos.append(m.start(1)); self._urls.append(lit)
+                continue
+            i = lit.find(",")
+            while i != -1:
+                # Giữ chuỗi đầu tiên bắt đầu bằng "<tiền tố>," (lần xuất hiện đầu tiên trong payload)
+                self._addresses.setdefault(lit[:i], lit)
+                i = lit.find(",", i + 1)
+
+    def address_for(self, name: str) -> str:
+        return self._addresses.get(name, "")
+
+    def website_near(self, name: str, pos: int, window: int = 12000) -> str:
+        lo = bisect.bisect_left(self._url_pos, pos - window)
+        hi = bisect.bisect_right(self._url_pos, pos + window)
+        start, end = max(0, pos - window), min(len(self.text), pos + window)
+        # Cả hai dấu nháy của url phải nằm trong cửa sổ, như khi regex chạy trên text[start:end]
+        cands = [(p, u) for p, u in zip(self._url_pos[lo:hi], self._urls[lo:hi]) if p - 1 >= start and p + len(u) + 1 <= end]
+        return _pick_website(cands, name, pos)
+
+def _new_row(kw_label: str, name: str, address: str = "", website: str = "", phone: str = "", category: str = "",
+             place_id: str = "", lat=None, lng=None) -> dict:
+    return {
+        "Từ khóa": kw_label, "Tên": name, "Địa chỉ": address or "", "Trang web": website or "",
+        "Điện thoại": phone or "", "Danh mục": category or "", "Place ID": place_id or "",
+        "Vĩ độ": lat if lat is not None else "", "Kinh độ": lng if lng is not None else "",
+        "Email": "", "Trạng thái": "Chưa lấy"
+    }
+
+def extract_rows_from_text(big_text: str, kw_label: str):
+    rows, seen = [], set()
+    index = PayloadIndex(big_text)
+    for m in BUSINESS_RE.finditer(big_text):
+        name, pos = m.group(3), m.start(3)
+        if name in seen: continue
+        seen.add(name)
+        rows.append(_new_row(kw_label, name, index.address_for(name), index.website_near(name, pos),
+                             lat=float(m.group(1)), lng=float(m.group(2))))
+    return rows
+
+def _dig(obj, *path):
+    """Lấy obj[i][j]... an toàn; trả về None nếu sai kiểu hoặc thiếu phần tử."""
+    for i in path:
+        if not isinstance(obj, list) or not -len(obj) <= i < len(obj): return None
+        obj = obj[i]
+    return obj
+
+def _is_place_record(node) -> bool:
+    # Bản ghi địa điểm: [.., [null, null, lat, lng] (9), "0x..:0x.." (10), "Tên" (11), ..]
+    coords = _dig(node, 9)
+    return (isinstance(_dig(node, 11), str) and isinstance(_dig(node, 10), str) and isinstance(coords, list)
+            and len(coords) >= 4 and coords[0] is None and coords[1] is None
+            and isinstance(coords[2], (int, float)) and isinstance(coords[3], (int, float)))
+
+def iter_place_records(obj):
+    """Duyệt mảng lồng nhau của response đã parse, yield từng bản ghi địa điểm (không đi sâu vào bên trong bản ghi)."""
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, list): continue
+        if _is_place_record(node):
+            yield node; continue
+        stack.extend(reversed(node))
+
+def _str_or_empty(v) -> str:
+    return v if isinstance(v, str) else ""
+
+def place_record_to_row(rec: list, kw_label: str) -> dict:
+    address = _str_or_empty(_dig(rec, 39))
+    if not address:
+        lines = _dig(rec, 2)
+        if isinstance(lines, list): address = ", ".join(x for x in lines if isinstance(x, str))
+    categories = _dig(rec, 13)
+    category = ", ".join(x for x in categories if isinstance(x, str)) if isinstance(categories, list) else ""
+    website = _str_or_empty(_dig(rec, 7, 0))
+    return _new_row(
+        kw_label, rec[11], address,
+        website if website and _is_business_url(website) else "",
+        _str_or_empty(_dig(rec, 178, 0, 0)), category,
+        _str_or_empty(_dig(rec, 78)) or rec[10],
+        lat=rec[9][2], lng=rec[9][3])
+
+def extract_rows_from_obj(obj, kw_label: str):
+    rows, seen = [], set()
+    for rec in iter_place_records(obj):
+        row = place_record_to_row(rec, kw_label)
+        if row["Place ID"] in seen: continue
+        seen.add(row["Place ID"]); rows.append(row)
+    return rows
+
+def extract_rows_from_body(body_text: str, kw_label: str):
+    """Trích xuất từ một body 'search?': duyệt JSON nếu parse được, nếu không thì dùng regex trên text."""
+    obj, cleaned_text = clean_google_maps_body(body_text)
+    if obj is not None: return extract_rows_from_obj(obj, kw_label)
+    return extract_rows_from_text(cleaned_text, kw_label)
+
+def row_key(row: dict):
+    """Khóa loại trùng: Place ID nếu có, nếu không thì (Tên, Trang web)."""
+    return row.get("Place ID") or (row.get("Tên"), row.get("Trang web"))
+
+# ==================================================
+# TRÍCH XUẤT EMAIL
+# ==================================================
+EMAIL_RE = re.compile(r'(?i)(?<![\w.\-])([A-Z0-9._%+\-]+@[A-Z0-9\-]+(?:\.[A-Z0-9\-]+)+)(?![\w.\-])')
+
+# Quét trang một lần bằng regex "mỏ neo" rẻ (@, [at], &#64;, mailto:, Cloudflare...); chỉ quanh mỗi mỏ neo
+# mới chạy pattern đầy đủ, vì chạy pattern email phức tạp trên mọi vị trí của trang nhiều MB rất chậm.
+_ENT = r'&\#x?[0-9A-F]{1,6};'
+_AT = r'(?:@|&\#0*64;|&\#x0*40;|&commat;|\s*[\[(]\s*at\s*[\])]\s*)'
+_DOT = r'(?:\.|&\#0*46;|&\#x0*2e;|&period;|\s*[\[(]\s*dot\s*[\])]\s*)'
+_DLABEL = r'(?:[A-Z0-9\-]|' + _ENT + r')+'
+EMAIL_ANCHOR_RE = re.compile(r'@|&(?:\#0*64;|\#x0*40;|commat;)|[\[(]\s*at\s*[\])]|data-cfemail="|email-protection\#|mailto:', re.IGNORECASE)
+CFEMAIL_RE = re.compile(r'(?:data-cfemail="|email-protection\#)([0-9A-F]+)', re.IGNORECASE)
+MAILTO_RE = re.compile(r'mailto:([^"\'<>\s?]+)', re.IGNORECASE)
+MAILTO_SPLIT_RE = re.compile(r'[,;]')
+OBFUSCATED_EMAIL_RE = re.compile(
+    r'(?<![\w.\-])((?:[A-Z0-9._%+\-]|' + _ENT + r')+' + _AT + _DLABEL + r'(?:' + _DOT + _DLABEL + r')+)(?![\w.\-])',
+    re.IGNORECASE)
+_OBFUSCATED_AT_RE = re.compile(r'\s*[\[(]\s*at\s*[\])]\s*', re.IGNORECASE)
+_OBFUSCATED_DOT_RE = re.compile(r'\s*[\[(]\s*dot\s*[\])]\s*', re.IGNORECASE)
+_LOCAL_LOOKBACK = 400  # phần local tối đa 64 ký tự, viết dạng thực thể HTML thì dài hơn
+
+def decode_cfemail(hex_str: str) -> str:
+    """Giải mã email Cloudflare: byte đầu là khóa XOR cho các byte còn lại."""
+    try:
+        key = int(hex_str[:2], 16)
+        return "".join(chr(int(hex_str[i:i + 2], 16) ^ key) for i in range(2, len(hex_str) - 1, 2))
+    except ValueError: return ""
+
+@lru_cache(maxsize=32)
+def compile_blocklist(blocklist: tuple):
+    """Gộp blocklist thành một regex: mỗi email chỉ cần một lần search để kiểm tra mọi chuỗi con/đuôi."""
+    parts = [re.escape(b.lower()) for b in blocklist if b]
+    return re.compile("|".join(parts)) if parts else None
+
+def _decode_email_candidate(raw: str) -> str:
+    cand = html_lib.unescape(raw) if "&" in raw else raw
+    if "[" in cand or "(" in cand:
+        cand = _OBFUSCATED_DOT_RE.sub(".", _OBFUSCATED_AT_RE.sub("@", cand))
+    return cand
+
+def iter_email_candidates(html: str):
+    """Duyệt trang một lần, yield các chuỗi email đã giải mã (chưa kiểm tra hợp lệ)."""
+    done = 0  # vị trí cuối của match trước, bỏ qua mỏ neo nằm trong match đó
+    for a in EMAIL_ANCHOR_RE.finditer(html):
+        p = a.start()
+        if p < done: continue
+        head = html[p].lower()
+        if head in "de":
+            m = CFEMAIL_RE.match(html, p)
+            if m: done = m.end(); yield decode_cfemail(m.group(1))
+            continue
+        if head == "m":
+            m = MAILTO_RE.match(html, p)
+            if m:
+                done = m.end()
+                # mailto:a@x.de,b@x.de / a@x.de;b@x.de: mỗi người nhận được kiểm tra riêng
+                yield from MAILTO_SPLIT_RE.split(unquote(html_lib.unescape(m.group(1))).split("?", 1)[0])
+            continue
+        for m in OBFUSCATED_EMAIL_RE.finditer(html, max(done, p - _LOCAL_LOOKBACK), a.end() + _LOCAL_LOOKBACK):
+            if m.start() <= p < m.end():
+                done = m.end(); yield _decode_email_candidate(m.group(1)); break
+            if m.start() > p: break
+
+def extract_emails_from_html(html: str, blocklist=None) -> list[str]:
+    blocked = compile_blocklist(tuple(blocklist or ()))
+    emails = set()
+    for cand in iter_email_candidates(html):
+        m = EMAIL_RE.fullmatch(cand.strip().strip('.,'))
+        if not m: continue
+        e = m.group(1)
+        if blocked and blocked.search(e.lower()): continue
+        emails.add(e)
+    return sorted(emails, key=str.lower)
+
+# ==================================================
+# LINK LIÊN HỆ
+# ==================================================
+# Giá trị thuộc tính trong nháy có thể chứa '>' (onclick="a>b"); 'data-href=' không phải href
+A_OPEN_RE = re.compile(r"""<a\b((?:[^>"']|"[^"]*"|'[^']*')*)>""", re.IGNORECASE)
+A_CLOSE_RE = re.compile(r'</a\s*>', re.IGNORECASE)
+HREF_RE = re.compile(r"""(?<![\w-])href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+TAG_RE = re.compile(r'<[^>]*>')
+_A_TEXT_MAX = 2000  # chỉ đọc text trong khoảng này sau thẻ <a> (tránh thẻ không đóng)
+
+@lru_cache(maxsize=32)
+def compile_hints(hints: tuple):
+    """Một regex cho mọi từ gợi ý; thứ tự trong cấu hình là độ ưu tiên (đứng trước = khả năng cao hơn)."""
+    parts = [h.lower() for h in hints if h]
+    if not parts: return None, {}
+    return re.compile("|".join(map(re.escape, parts))), {h: i for i, h in reversed(list(enumerate(parts)))}
+
+def _hint_rank(matcher, ranks: dict, s: str):
+    best = None
+    for m in matcher.finditer(s):
+        r = ranks[m.group(0)]
+        if best is None or r < best: best = r
+        if best == 0: break
+    return best
+
+def pick_contact_links_from_html(base_url: str, html: str, hints: list[str], limit=6):
+    """Quét thẻ <a href> bằng regex (không dựng cây DOM), xếp link theo độ ưu tiên của từ gợi ý.
+
+    Link khớp ở URL đứng trước link chỉ khớp ở text; cùng hạng thì giữ thứ tự trong trang.
+    Dừng sớm khi đã có đủ `limit` link hạng cao nhất.
+    """
+    matcher, ranks = compile_hints(tuple(hints))
+    if matcher is None: return []
+    seen, found = set(), []
+    for order, a in enumerate(A_OPEN_RE.finditer(html)):
+        h = HREF_RE.search(a.group(1))
+        if not h: continue
+        href = html_lib.unescape(next(g for g in h.groups() if g is not None)).strip()
+        if not href or href.startswith("#") or href.lower().startswith(("mailto:", "tel:", "javascript:")): continue
+        abs_u = urljoin(base_url, href)
+        if abs_u in seen: continue
+        rank = _hint_rank(matcher, ranks, abs_u.lower())
+        in_url = rank is not None
+        if rank is None or rank > 0:
+            close = A_CLOSE_RE.search(html, a.end(), a.end() + _A_TEXT_MAX)
+            text = html_lib.unescape(TAG_RE.sub(" ", html[a.end():close.start() if close else a.end() + _A_TEXT_MAX])).lower()
+            text_rank = _hint_rank(matcher, ranks, text)
+            if text_rank is not None and (rank is None or text_rank < rank): rank, in_url = text_rank, False
+        if rank is None: continue
+        seen.add(abs_u); found.append(((rank, not in_url, order), abs_u))
+        if sum(1 for k, _ in found if k[:2] == (0, False)) >= limit: break
+    found.sort(key=lambda x: x[0])
+    return [u for _, u in found[:limit]]
+
+# ==================================================
+# CÓ CẦN RENDER BẰNG SELENIUM KHÔNG
+# ==================================================
+# Tín hiệu cho thấy nội dung trang chỉ có sau khi chạy JavaScript
+JS_SHELL_RE = re.compile(
+    r'<div[^>]+id=["\'](?:root|app|__next|__nuxt|q-app)["\'][^>]*>\s*</div>'
+    r'|\bng-app\b|\bng-version=|window\.__(?:INITIAL_STATE|NUXT|APOLLO_STATE)__|static\.parastorage\.com|static\.wixstatic\.com'
+    r'|<noscript[^>]*>[^<]{0,300}(?:javascript|JavaScript)', re.IGNORECASE)
+SCRIPT_STYLE_RE = re.compile(r'<(script|style|noscript)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+SCRIPT_TAG_RE = re.compile(r'<script\b', re.IGNORECASE)
+EMAIL_FORM_RE = re.compile(r'<form\b.{0,4000}?(?:type=["\']email["\']|name=["\'][^"\']*e-?mail)', re.IGNORECASE | re.DOTALL)
+_CLASSIFY_MAX = 500_000  # chỉ xét phần đầu trang rất lớn
+_MIN_VISIBLE_TEXT = 250
+
+def visible_text_length(html: str) -> int:
+    body = SCRIPT_STYLE_RE.sub(" ", html[:_CLASSIFY_MAX])
+    return len(" ".join(html_lib.unescape(TAG_RE.sub(" ", body)).split()))
+
+def classify_escalation(pages: list) -> tuple:
+    """Quyết định site có cần render bằng Selenium không, dựa trên HTML đã tải ở pha request.
+
+    Trả về (cần_render, lý do). Chỉ render khi trang là khung JS / gần như rỗng; trang tĩnh có đủ nội dung
+    hoặc chỉ có form liên hệ thì render cũng không ra email.
+    """
+    for html in pages:
+        head = html[:_CLASSIFY_MAX]
+        if not head.strip(): return True, "trang rỗng"
+        if JS_SHELL_RE.search(head): return True, "khung ứng dụng JavaScript"
+        if visible_text_length(head) < _MIN_VISIBLE_TEXT:
+            return True, "gần như không có nội dung tĩnh" + (" (nhiều script)" if len(SCRIPT_TAG_RE.findall(head)) >= 3 else "")
+    if any(EMAIL_FORM_RE.search(html[:_CLASSIFY_MAX]) for html in pages): return False, "chỉ có form liên hệ, không có địa chỉ email"
+    return False, "trang tĩnh không có email"
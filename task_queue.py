@@ -0,0 +1,152 @@
+# task_queue.py
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+# ==================================================
+# HÀNG ĐỢI VIỆC CHO WORKER PHÂN TÁN (SQLite, CÓ LEASE)
+# ==================================================
+# App ghi việc vào hàng đợi; worker (worker.py, có thể trên máy khác) lấy việc qua API của app.
+# - lease(): nhận việc kèm token và hạn lease; việc 'leased' quá hạn được coi như trả lại hàng đợi.
+# - heartbeat(): gia hạn lease khi việc còn đang chạy.
+# - complete()/fail() chỉ có hiệu lực khi token còn đúng (worker bị mất lease thì kết quả bị bỏ qua).
+# Giao ít nhất một lần: một việc có thể chạy lại nếu worker chết hoặc mất lease, nên phía ghi kết quả phải idempotent.
+
+class TaskQueue:
+    FILE = "task_queue.sqlite3"
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL,
+        payload TEXT NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,
+        not_before REAL NOT NULL DEFAULT 0, lease_owner TEXT, lease_token TEXT, lease_until REAL, error TEXT,
+        created_at REAL NOT NULL, updated_at REAL NOT NULL, UNIQUE (job_id, key));
+    CREATE INDEX IF NOT EXISTS queue_ready ON queue (kind, state, not_before);
+    """
+
+    def __init__(self, path: str = None):
+        self._db = sqlite3.connect(path or self.FILE, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(self.SCHEMA)
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def put_many(self, job_id: str, kind: str, items, max_attempts: int = 3) -> int:
+        """items: [(key, payload)]. Việc đã có (cùng job_id, key) mà chưa xong thì được đưa lại trạng thái chờ."""
+        now = time.time()
+        with self._lock:
+            n = 0
+            for key, payload in items:
+                cur = self._db.execute(
+                    """INSERT INTO queue (job_id, kind, key, payload, state, max_attempts, created_at, updated_at)
+                       VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)
+                       ON CONFLICT (job_id, key) DO UPDATE SET state = 'queued', attempts = 0, payload = excluded.payload,
+                       max_attempts = excluded.max_attempts, not_before = 0, lease_owner = NULL, lease_token = NULL,
+                       lease_until = NULL, error = NULL, updated_at = excluded.updated_at WHERE queue.state != 'done'""",
+                    (job_id, kind, key, json.dumps(payload, ensure_ascii=False), max(1, int(max_attempts)), now, now))
+                n += cur.rowcount
+            self._db.commit()
+        return n
+
+    def lease(self, worker: str, kinds: list, n: int = 1, lease_seconds: float = 300) -> list:
+        """Nhận tối đa n việc thuộc các loại kinds; trả về [{id, token, job_id, kind, key, payload, attempt}]."""
+        if n <= 0 or not kinds: return []
+        now = time.time()
+        marks = ",".join("?" * len(kinds))
+        with self._lock:
+            # Không giao việc trùng key với một việc (của job khác) đang được worker giữ: cùng domain chỉ crawl ở một nơi
+            rows = self._db.execute(
+                f"""SELECT id, job_id, kind, key, payload, attempts FROM queue
+                    WHERE kind IN ({marks}) AND not_before <= ?
+                      AND (state = 'queued' OR (state = 'leased' AND lease_until < ? AND attempts < max_attempts))
+                      AND NOT EXISTS (SELECT 1 FROM queue q2 WHERE q2.kind = queue.kind AND q2.key = queue.key AND q2.id != queue.id
+                                      AND q2.state = 'leased' AND q2.lease_until >= ?)
+                    ORDER BY id LIMIT ?""", (*kinds, now, now, now, int(n))).fetchall()
+            out, keys = [], set()
+            for task_id, job_id, kind, key, payload, attempts in rows:
+                if (kind, key) in keys: continue
+                keys.add((kind, key))
+                token = uuid.uuid4().hex
+                self._db.execute("""UPDATE queue SET state = 'leased', attempts = attempts + 1, lease_owner = ?, lease_token = ?,
+                                    lease_until = ?, updated_at = ? WHERE id = ?""",
+                                 (worker, token, now + lease_seconds, now, task_id))
+                out.append({"id": task_id, "token": token, "job_id": job_id, "kind": kind, "key": key,
+                            "payload": json.loads(payload), "attempt": attempts + 1})
+            self._db.commit()
+        return out
+
+    def _owned(self, task_id: int, token: str):
+        """Trả về (job_id, key, attempts, max_attempts, payload) nếu token còn giữ lease, ngược lại None."""
+        return self._db.execute("SELECT job_id, key, attempts, max_attempts, payload FROM queue WHERE id = ? AND state = 'leased' AND lease_token = ?",
+                                (task_id, token)).fetchone()
+
+    def heartbeat(self, task_id: int, token: str, lease_seconds: float = 300) -> bool:
+        with self._lock:
+            cur = self._db.execute("UPDATE queue SET lease_until = ?, updated_at = ? WHERE id = ? AND state = 'leased' AND lease_token = ?",
+                                   (time.time() + lease_seconds, time.time(), task_id, token))
+            self._db.commit()
+        return cur.rowcount == 1
+
+    def owner_of(self, task_id: int, token: str):
+        """(job_id, key) của việc nếu token còn hiệu lực."""
+        with self._lock: r = self._owned(task_id, token)
+        return (r[0], r[1]) if r else None
+
+    def complete(self, task_id: int, token: str):
+        """Đánh dấu xong; trả về (job_id, key) hoặc None nếu lease đã mất (kết quả của lần chạy này bị bỏ qua)."""
+        with self._lock:
+            r = self._owned(task_id, token)
+            if not r: return None
+            self._db.execute("UPDATE queue SET state = 'done', lease_token = NULL, error = NULL, updated_at = ? WHERE id = ?",
+                             (time.time(), task_id))
+            self._db.commit()
+        return r[0], r[1]
+
+    def fail(self, task_id: int, token: str, error: str, retry: bool = True, backoff: float = 30.0):
+        """Trả việc về hàng đợi (chờ backoff giây, tăng dần theo số lần thử) hoặc đánh dấu 'failed' khi hết lượt.
+
+        Trả về (job_id, key, payload, trạng thái mới) hoặc None nếu lease đã mất.
+        """
+        with self._lock:
+            r = self._owned(task_id, token)
+            if not r: return None
+            job_id, key, attempts, max_attempts, payload = r
+            state = "queued" if retry and attempts < max_attempts else "failed"
+            self._db.execute("""UPDATE queue SET state = ?, not_before = ?, lease_token = NULL, lease_until = NULL, error = ?,
+                                updated_at = ? WHERE id = ?""",
+                             (state, time.time() + backoff * attempts, str(error)[:500], time.time(), task_id))
+            self._db.commit()
+        return job_id, key, json.loads(payload), state
+
+    def expire_leases(self) -> list:
+        """Việc có lease quá hạn mà đã hết lượt thử -> 'failed'. Trả về [(job_id, key, payload)] vừa bị đánh dấu."""
+        now = time.time()
+        with self._lock:
+            rs = self._db.execute("SELECT id, job_id, key, payload FROM queue WHERE state = 'leased' AND lease_until < ? AND attempts >= max_attempts",
+                                  (now,)).fetchall()
+            for task_id, *_ in rs:
+                self._db.execute("UPDATE queue SET state = 'failed', lease_token = NULL, error = 'hết hạn lease', updated_at = ? WHERE id = ?",
+                                 (now, task_id))
+            self._db.commit()
+        return [(job_id, key, json.loads(payload)) for _, job_id, key, payload in rs]
+
+    def outstanding(self, job_id: str) -> int:
+        """Số việc của job chưa kết thúc (đang chờ hoặc đang chạy)."""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM queue WHERE job_id = ? AND state IN ('queued', 'leased')", (job_id,)).fetchone()[0]
+
+    def counts(self, job_id: str = None) -> dict:
+        with self._lock:
+            if job_id: rs = self._db.execute("SELECT state, COUNT(*) FROM queue WHERE job_id = ? GROUP BY state", (job_id,)).fetchall()
+            else: rs = self._db.execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall()
+        return dict(rs)
+
+    def workers(self) -> list:
+        """Worker đang giữ lease còn hạn: [(tên, số việc)]."""
+        with self._lock:
+            return self._db.execute("SELECT lease_owner, COUNT(*) FROM queue WHERE state = 'leased' AND lease_until >= ? GROUP BY lease_owner",
+                                    (time.time(),)).fetchall()
+
+    def close(self):
+        with self._lock: self._db.close()
@@ -0,0 +1,5 @@
+# Module nằm phẳng ở thư mục gốc repo
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from domain_cache import DomainCache
+
+@pytest.fixture
+def cache(tmp_path):
+    c = DomainCache(str(tmp_path / "cache.sqlite3"), ttl_hours=1, negative_ttl_hours=0.5)
+    yield c
+    c.close()
+
+def age(c, domain, seconds):
+    c._db.execute("UPDATE domains SET fetched_at = fetched_at - ? WHERE domain = ?", (seconds, domain)); c._db.commit()
+
+def test_put_get_roundtrip(cache):
+    assert cache.get("a.de") is None
+    cache.put("a.de", ["info@a.de", "büro@a.de"], "HOME", "ok")
+    hit = cache.get("a.de")
+    assert hit["emails"] == ["info@a.de", "büro@a.de"] and hit["source"] == "HOME" and hit["status"] == "ok"
+
+def test_positive_ttl(cache):
+    cache.put("a.de", ["info@a.de"], "HOME", "ok")
+    age(cache, "a.de", 3000)
+    assert cache.get("a.de") is not None
+    age(cache, "a.de", 700)
+    assert cache.get("a.de") is None
+
+def test_negative_ttl_is_shorter(cache):
+    cache.put("a.de", [], None, "none")
+    age(cache, "a.de", 1700)
+    assert cache.get("a.de") == {"emails": [], "source": None, "status": "none", "fetched_at": pytest.approx(time.time() - 1700, abs=5)}
+    age(cache, "a.de", 200)
+    assert cache.get("a.de") is None
+
+def test_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    c = DomainCache(path); c.put("a.de", ["info@a.de"], "HOME", "ok"); c.close()
+    c = DomainCache(path)
+    assert c.get("a.de")["emails"] == ["info@a.de"]
+    c.close()
+
+def test_claim_waits_for_first_crawl(cache):
+    order, started = [], threading.Event()
+
+    def second():
+        started.set()
+        with cache.claim("a.de") as cached: order.append(("second", cached and cached["emails"]))
+
+    with cache.claim("a.de") as cached:
+        assert cached is None
+        t = threading.Thread(target=second); t.start(); started.wait()
+        time.sleep(0.1)
+        order.append(("first", None))
+        cache.put("a.de", ["info@a.de"], "HOME", "ok")
+    t.join(5)
+    assert order == [("first", None), ("second", ["info@a.de"])]
+    assert cache._inflight == {}
+
+def test_claim_is_shared_across_connections(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    a, b = DomainCache(path), DomainCache(path)
+    monkeypatch.setattr(DomainCache, "CLAIM_POLL", 0.02)
+    done = []
+
+    def other():
+        with b.claim("a.de") as cached: done.append(cached["emails"])
+
+    with a.claim("a.de"):
+        t = threading.Thread(target=other); t.start()
+        time.sleep(0.1)
+        assert done == []
+        a.put("a.de", ["info@a.de"], "HOME", "ok")
+    t.join(5)
+    assert done == [["info@a.de"]]
+    a.close(); b.close()
+
+def test_expired_claim_is_taken_over(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    a, b = DomainCache(path), DomainCache(path)
+    assert a._try_claim("a.de", "dead-owner")
+    assert not b._try_claim("a.de", "other")
+    a._db.execute("UPDATE claims SET until = 0"); a._db.commit()
+    assert b._try_claim("a.de", "other")
+    a._release("a.de", "dead-owner")  # chủ cũ không được xoá lease của chủ mới
+    assert not a._try_claim("a.de", "third")
+    a.close(); b.close()
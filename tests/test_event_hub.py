@@ -0,0 +1,57 @@
+from event_hub import EventHub, coalesce, sse_frames
+
+def frames(channel, last_seq=0):
+    return list(sse_frames(channel, last_seq, batch_window=0))
+
+def test_coalesce_keeps_logs_latest_progress_and_row():
+    events = list(enumerate([
+        {"type": "log", "msg": "a"}, {"type": "progress", "done": 1}, {"type": "row", "idx": 1, "email": ""},
+        {"type": "complete"}, {"type": "row", "idx": 2}, {"type": "row", "idx": 1, "email": "x@y.de"},
+        {"type": "progress", "done": 2}, {"type": "log", "msg": "b"},
+    ], 1))
+    out = coalesce(events)
+    assert [e["type"] for e in out] == ["log", "log", "row", "row", "progress", "complete"]
+    assert [e.get("idx") for e in out if e["type"] == "row"] == [2, 1]
+    assert out[3]["email"] == "x@y.de" and out[4]["done"] == 2
+
+def test_read_reports_dropped_events():
+    ch = EventHub(maxlen=3).channel("j")
+    for i in range(5): ch.log(str(i))
+    events, dropped, closed = ch.read(0, timeout=0)
+    assert [seq for seq, _ in events] == [3, 4, 5] and dropped == 2 and not closed
+
+def test_sse_ids_carry_channel_epoch():
+    hub = EventHub()
+    ch = hub.open("j")
+    ch.log("a"); ch.close(status="done")
+    out = frames(ch)
+    assert len(out) == 1 and out[0].startswith(f"id: {ch.epoch}-2\n")
+    assert ch.resume_seq(f"{ch.epoch}-1") == 1
+    # Đọc tiếp từ id cuối: không còn gì, kênh đã đóng
+    assert frames(ch, ch.resume_seq(f"{ch.epoch}-2")) == []
+
+def test_resume_seq_resets_for_other_channel():
+    hub = EventHub()
+    old = hub.open("j")
+    for i in range(5): old.log(str(i))
+    old.close(status="done")
+    new = hub.open("j")
+    assert new is not old
+    new.log("mới")
+    assert new.resume_seq(f"{old.epoch}-6") == 0
+    assert new.resume_seq("6") == 0      # seq vượt quá kênh hiện tại
+    assert new.resume_seq("1") == 1
+    assert new.resume_seq(None) == 0 and new.resume_seq("rác") == 0
+
+def test_hub_never_evicts_open_channels():
+    hub = EventHub(max_channels=2)
+    a, b = hub.channel("a"), hub.channel("b")
+    c = hub.channel("c")
+    # Mọi kênh đều đang mở: vượt giới hạn thay vì bỏ kênh của job đang chạy
+    assert hub.get("a") is a and hub.get("b") is b and hub.get("c") is c
+    a.close(status="done")
+    hub.channel("d")
+    assert hub.get("a") is None and hub.get("b") is b
+    # Kênh bị giữ lại vẫn là kênh mà người đọc mới nhận được
+    b.log("x")
+    assert hub.channel("b").read(0, timeout=0)[0][0][1]["msg"] == "x"
@@ -0,0 +1,56 @@
+import csv
+import io
+import json
+
+import pytest
+
+import exporter
+
+ROWS = [
+    {"Từ khóa": "phở | Quận 1", "Tên": "Phở A", "Email": "a@pho.vn", "Trạng thái": "OK - HOME"},
+    {"Từ khóa": "bún | Quận 3", "Tên": "Bún B", "Email": "", "Trạng thái": "Không tìm thấy email"},
+    {"Từ khóa": "Phở | Quận 5", "Tên": "Phở C", "Email": "c@pho.vn", "Trạng thái": "Từ cache (HOME)", "Khác": 1},
+]
+
+def joined(chunks) -> str:
+    return "".join(chunks)
+
+def test_csv_has_bom_header_and_blank_missing_columns():
+    text = joined(exporter.export_stream("csv", iter(ROWS), ["Tên", "Email", "Điện thoại"]))
+    assert text.startswith("﻿")
+    assert list(csv.reader(io.StringIO(text[1:]))) == [
+        ["Tên", "Email", "Điện thoại"], ["Phở A", "a@pho.vn", ""], ["Bún B", "", ""], ["Phở C", "c@pho.vn", ""]]
+
+def test_csv_is_streamed_in_chunks(monkeypatch):
+    monkeypatch.setattr(exporter, "CHUNK_ROWS", 2)
+    chunks = list(exporter.iter_csv(iter(ROWS * 2), ["Tên"]))
+    assert len(chunks) == 4 and joined(chunks).count("\r\n") == 7
+
+def test_jsonl_keeps_only_selected_columns(monkeypatch):
+    monkeypatch.setattr(exporter, "CHUNK_ROWS", 2)
+    chunks = list(exporter.export_stream("jsonl", iter(ROWS), ["Tên", "Email"]))
+    assert len(chunks) == 2
+    assert [json.loads(l) for l in joined(chunks).splitlines()] == [
+        {"Tên": "Phở A", "Email": "a@pho.vn"}, {"Tên": "Bún B", "Email": ""}, {"Tên": "Phở C", "Email": "c@pho.vn"}]
+
+def test_filters_are_case_insensitive_substrings():
+    assert [r["Tên"] for r in exporter.filter_rows(ROWS, keyword="phở")] == ["Phở A", "Phở C"]
+    assert [r["Tên"] for r in exporter.filter_rows(ROWS, status="ok")] == ["Phở A"]
+    assert [r["Tên"] for r in exporter.filter_rows(ROWS, status="email", keyword="BÚN")] == ["Bún B"]
+    assert len(list(exporter.filter_rows(ROWS))) == 3
+
+def test_select_columns_defaults_and_order():
+    assert exporter.select_columns(None) == exporter.EXPORT_COLUMNS
+    assert exporter.select_columns(["", None]) == exporter.EXPORT_COLUMNS
+    assert exporter.select_columns(["Email", "Tên"]) == ["Email", "Tên"]
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        exporter.export_stream("pdf", iter(ROWS), ["Tên"])
+
+def test_xlsx_roundtrip(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    data = b"".join(exporter.export_stream("xlsx", iter(ROWS), ["Tên", "Email"]))
+    path = tmp_path / "out.xlsx"; path.write_bytes(data)
+    ws = openpyxl.load_workbook(path).active
+    assert [[c.value or "" for c in r] for r in ws.iter_rows()] == [["Tên", "Email"], ["Phở A", "a@pho.vn"], ["Bún B", ""], ["Phở C", "c@pho.vn"]]
@@ -0,0 +1,145 @@
+import socket
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("selenium")
+import crawler_logic as crawler
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text="", headers=None):
+        self.status_code, self.text, self.headers = status_code, text, headers or {}
+
+
+class FakeSession:
+    """Trả lần lượt các response cho mỗi URL; ghi lại các URL đã gọi."""
+    def __init__(self, responses):
+        self.responses, self.calls = {u: list(rs) for u, rs in responses.items()}, []
+
+    def get(self, url, timeout=None):
+        self.calls.append(url)
+        rs = self.responses.get(url) or [FakeResponse(404)]
+        return rs.pop(0) if len(rs) > 1 else rs[0]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(crawler.time, "sleep", sleeps.append)
+    monkeypatch.setattr(crawler, "lookup_host", lambda host: ("", ""))
+    eng = crawler.HttpEngine(max_total=4, max_per_host=1, host_delay=0, retries=2, respect_robots=True)
+    eng.sleeps = sleeps
+    return eng
+
+
+def test_retries_transient_status_then_succeeds(engine):
+    engine._session = FakeSession({
+        "https://a.vn/robots.txt": [FakeResponse(404)],
+        "https://a.vn/lien-he": [FakeResponse(503), FakeResponse(200, "ok")],
+    })
+    assert engine.get("https://a.vn/lien-he") == "ok"
+    assert engine._session.calls.count("https://a.vn/lien-he") == 2
+    assert len(engine.sleeps) == 1
+
+
+def test_retry_after_extends_backoff(engine):
+    engine._session = FakeSession({
+        "https://a.vn/robots.txt": [FakeResponse(404)],
+        "https://a.vn/": [FakeResponse(429, headers={"Retry-After": "7"}), FakeResponse(200, "ok")],
+    })
+    assert engine.get("https://a.vn/") == "ok"
+    assert engine.sleeps == [7.0]
+
+
+def test_gives_up_with_transient_error(engine):
+    engine._session = FakeSession({"https://a.vn/robots.txt": [FakeResponse(404)], "https://a.vn/": [FakeResponse(502)]})
+    with pytest.raises(crawler.TransientFetchError):
+        engine.get("https://a.vn/")
+    assert engine._session.calls.count("https://a.vn/") == 3
+
+
+def test_client_error_is_permanent_without_retry(engine):
+    engine._session = FakeSession({"https://a.vn/robots.txt": [FakeResponse(404)], "https://a.vn/x": [FakeResponse(404)]})
+    with pytest.raises(crawler.PermanentFetchError):
+        engine.get("https://a.vn/x")
+    assert engine._session.calls.count("https://a.vn/x") == 1
+
+
+def test_robots_disallow(engine):
+    engine._session = FakeSession({"https://a.vn/robots.txt": [FakeResponse(200, "User-agent: *\nDisallow: /private")]})
+    with pytest.raises(crawler.RobotsDisallowed):
+        engine.get("https://a.vn/private/lien-he")
+    assert engine._session.calls == ["https://a.vn/robots.txt"]
+
+
+def test_robots_cached_per_origin(engine):
+    engine._session = FakeSession({"https://a.vn/robots.txt": [FakeResponse(404)], "https://a.vn/": [FakeResponse(200, "ok")]})
+    engine.get("https://a.vn/"); engine.get("https://a.vn/")
+    assert engine._session.calls.count("https://a.vn/robots.txt") == 1
+
+
+def test_host_slots_released_after_use(engine):
+    engine._session = FakeSession({"https://a.vn/robots.txt": [FakeResponse(404)], "https://a.vn/": [FakeResponse(200, "ok")]})
+    engine.get("https://a.vn/")
+    assert engine._hosts == {}
+
+
+def test_order_by_host_interleaves_domains():
+    urls = ["https://a.vn/1", "https://www.a.vn/2", "https://a.vn/3", "https://b.vn/1", "https://c.vn/1", "https://b.vn/2"]
+    ordered = crawler.HttpEngine.order_by_host(urls, lambda u: u)
+    assert ordered == ["https://a.vn/1", "https://b.vn/1", "https://c.vn/1", "https://www.a.vn/2", "https://b.vn/2", "https://a.vn/3"]
+
+
+def test_lookup_host_classifies_dns_errors(monkeypatch):
+    def fake_getaddrinfo(host, *a):
+        if host == "khong-ton-tai.vn": raise socket.gaierror(socket.EAI_NONAME, "not known")
+        if host == "cham.vn": raise socket.gaierror(socket.EAI_AGAIN, "try again")
+        return [(socket.AF_INET6, socket.SOCK_STREAM, 6, "", ("2001:db8::1", 0, 0, 0))]
+    monkeypatch.setattr(crawler.socket, "getaddrinfo", fake_getaddrinfo)
+    monkeypatch.setattr(crawler, "_dns_cache", {})
+    assert crawler.lookup_host("v6.vn") == ("2001:db8::1", "")
+    assert crawler.lookup_host("khong-ton-tai.vn") == ("", "nxdomain")
+    assert crawler.lookup_host("cham.vn") == ("", "transient")
+    assert "cham.vn" not in crawler._dns_cache and "khong-ton-tai.vn" in crawler._dns_cache
+
+
+def test_unresolvable_host_fails_fast(engine, monkeypatch):
+    monkeypatch.setattr(crawler, "lookup_host", lambda host: ("", "nxdomain"))
+    engine._session = FakeSession({})
+    with pytest.raises(crawler.PermanentFetchError):
+        engine.get("https://khong-ton-tai.vn/")
+    assert engine._session.calls == []
+
+
+def test_dns_hiccup_is_transient(engine, monkeypatch):
+    monkeypatch.setattr(crawler, "lookup_host", lambda host: ("", "transient"))
+    with pytest.raises(crawler.TransientFetchError):
+        engine.get("https://a.vn/")
+
+
+HOME_WITH_EMAIL = '<footer><a href="/lien-he">Liên hệ</a> info@a.vn</footer>'
+
+
+def _request_phase(monkeypatch, home, contact_results):
+    monkeypatch.setattr(crawler, "fetch_html", lambda url: home)
+    monkeypatch.setattr(crawler.HTTP, "get_many", lambda urls: iter(contact_results))
+    return crawler.request_phase_contact_only("a.vn", ["lien-he"], [], lambda msg: None)
+
+
+def test_request_phase_uses_home_email_when_contact_fails(monkeypatch):
+    err = crawler.TransientFetchError("HTTP 503")
+    emails, source, status, _ = _request_phase(monkeypatch, HOME_WITH_EMAIL, [("https://a.vn/lien-he", "", err)])
+    assert (emails, status) == (["info@a.vn"], "ok") and "HOME" in source
+
+
+def test_request_phase_transient_only_without_any_email(monkeypatch):
+    err = crawler.TransientFetchError("HTTP 503")
+    home = '<a href="/lien-he">Liên hệ</a>'
+    assert _request_phase(monkeypatch, home, [("https://a.vn/lien-he", "", err)])[2] == "transient"
+
+
+def test_request_phase_blocked_home_escalates(monkeypatch):
+    def blocked(url): raise crawler.PermanentFetchError("HTTP 403", 403)
+    monkeypatch.setattr(crawler, "fetch_html", blocked)
+    assert crawler.request_phase_contact_only("a.vn", ["lien-he"], [], lambda msg: None)[2] == "render"
@@ -0,0 +1,38 @@
+import pytest
+
+from job_store import JobStore
+
+@pytest.fixture
+def store(tmp_path):
+    s = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield s
+    s._db.close()
+
+def test_rows_are_appended_and_updated(store):
+    job = store.create_job("harvest", {"main_kw": "phở"})
+    assert [store.add_row(job, {"Tên": n}) for n in ("A", "B", "C")] == [0, 1, 2]
+    store.update_row(job, 1, {"Tên": "B", "Email": "b@x.vn"})
+    assert store.get_row(job, 1) == {"Tên": "B", "Email": "b@x.vn"}
+    assert [idx for idx, _ in store.iter_rows(job, chunk=2)] == [0, 1, 2]
+    assert store.count_rows(job) == 3 and store.get_row(job, 7) is None
+
+def test_tasks_checkpoint(store):
+    job = store.create_job("email", {}, parent_id="h1")
+    store.add_tasks(job, ["0", "1", "2"])
+    store.add_tasks(job, ["1"])  # resume không tạo trùng
+    store.set_task(job, "0", "done"); store.set_task(job, "2", "error", "timeout")
+    assert store.unfinished_tasks(job) == ["1", "2"]
+    assert store.task_counts(job) == {"done": 1, "pending": 1, "error": 1}
+
+def test_interrupt_running_on_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    s = JobStore(path)
+    running, done = s.create_job("harvest", {}), s.create_job("harvest", {})
+    s.set_job_status(done, "done", {"rows": 0})
+    s._db.close()
+    s = JobStore(path)
+    assert s.interrupt_running() == [running]
+    assert s.get_job(running)["status"] == "interrupted"
+    assert s.get_job(done)["status"] == "done" and s.get_job(done)["summary"] == {"rows": 0}
+    assert s.latest_job("harvest") in (running, done)
+    s._db.close()
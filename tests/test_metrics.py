@@ -0,0 +1,62 @@
+import json
+import threading
+
+import metrics
+
+
+def test_snapshot_merge_round_trip():
+    child = metrics.Registry()
+    child.inc("crawl_sites_total", outcome="ok"); child.inc("crawl_sites_total", 2, outcome="ok")
+    child.observe("crawl_stage_seconds", 0.02, stage="extract"); child.observe("crawl_stage_seconds", 3.0, stage="extract")
+    child.observe_domain("a.vn", 1.5)
+    # Snapshot đi qua queue/JSON giữa các tiến trình: tuple nhãn trở thành list
+    snap = json.loads(json.dumps(child.snapshot(reset=True)))
+    assert child.counters == {} and child.hists == {}
+
+    parent = metrics.Registry()
+    parent.inc("crawl_sites_total", outcome="ok")
+    parent.merge(snap); parent.merge(snap)
+    assert parent.counters[("crawl_sites_total", (("outcome", "ok"),))] == 7
+    h = parent.hists[("crawl_stage_seconds", (("stage", "extract"),))]
+    assert (h.count, round(h.sum, 3), h.max) == (4, 6.04, 3.0)
+    assert parent.slowest_domains()[0] == {"domain": "a.vn", "requests": 2, "total_s": 3.0, "avg_ms": 1500.0, "max_ms": 1500.0}
+
+def test_domains_capped():
+    reg = metrics.Registry(max_domains=2)
+    for d in ("a.vn", "b.vn", "c.vn"): reg.observe_domain(d, 0.1)
+    assert list(reg.domains) == ["b.vn", "c.vn"]
+
+def test_render_prometheus():
+    reg = metrics.Registry()
+    reg.inc("crawl_http_requests_total", outcome="ok")
+    reg.add_gauge("crawl_drivers_active", 1, pool="email")
+    reg.observe("crawl_stage_seconds", 0.02, stage="http_fetch"); reg.observe("crawl_stage_seconds", 100.0, stage="http_fetch")
+    reg.observe_domain('x"y.vn', 0.5)
+    lines = reg.render_prometheus().splitlines()
+    assert "# TYPE crawl_http_requests_total counter" in lines
+    assert 'crawl_http_requests_total{outcome="ok"} 1' in lines
+    assert 'crawl_drivers_active{pool="email"} 1' in lines
+    assert lines.count("# TYPE crawl_stage_seconds histogram") == 1
+    assert 'crawl_stage_seconds_bucket{stage="http_fetch",le="0.01"} 0' in lines
+    assert 'crawl_stage_seconds_bucket{stage="http_fetch",le="0.025"} 1' in lines
+    assert 'crawl_stage_seconds_bucket{stage="http_fetch",le="60.0"} 1' in lines
+    assert 'crawl_stage_seconds_bucket{stage="http_fetch",le="+Inf"} 2' in lines
+    assert 'crawl_stage_seconds_count{stage="http_fetch"} 2' in lines
+    assert 'crawl_domain_seconds_sum{domain="x\\"y.vn"} 0.5' in lines
+
+def test_summary_stages_and_cache_hit_rate():
+    reg = metrics.Registry()
+    reg.inc("crawl_cache_total", result="hit"); reg.inc("crawl_cache_total", 3, result="miss")
+    for v in (0.004, 0.2, 0.2, 7.0): reg.observe("crawl_stage_seconds", v, stage="site")
+    s = reg.summary()
+    assert s["cache_hit_rate"] == 0.25
+    assert s["stages"]["site"]["count"] == 4 and s["stages"]["site"]["p50_ms"] == 250.0 and s["stages"]["site"]["max_ms"] == 7000.0
+
+def test_bind_and_propagate_to_other_thread():
+    job = metrics.Registry()
+    with metrics.bind(job):
+        task = metrics.propagate(lambda: metrics.inc("crawl_test_total"))
+    t = threading.Thread(target=task); t.start(); t.join()
+    assert job.counters == {("crawl_test_total", ()): 1}
+    metrics.inc("crawl_test_total")
+    assert job.counters[("crawl_test_total", ())] == 1
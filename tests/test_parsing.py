@@ -0,0 +1,150 @@
+import json
+
+import pytest
+
+import parsing
+
+def place(name, place_id, website=None, address="1 Lê Lợi, Quận 1", category="Nhà hàng"):
+    rec = [None] * 180
+    rec[9] = [None, None, 10.77, 106.7]
+    rec[10], rec[11], rec[78] = "0x1:0x2", name, place_id
+    rec[13], rec[39] = [category], address
+    if website: rec[7] = [website, None]
+    rec[178] = [["028 1234 5678"]]
+    return rec
+
+# --- Payload Maps ---
+def test_clean_google_maps_body_prefixes():
+    assert parsing.clean_google_maps_body(")]}'\n[1, 2]") == ([1, 2], "[1, 2]")
+    assert parsing.clean_google_maps_body(json.dumps({"d": ")]}'\n[3]"}) + '/*""*/') == ([3], "[3]")
+    assert parsing.clean_google_maps_body(")]}'\n[1,") == (None, "[1,")
+    assert parsing.clean_google_maps_body(None) == (None, "")
+
+def test_extract_rows_from_json_body():
+    obj = [None, [[None, place("Phở A", "P1", "https://pho-a.vn/")], [None, place("Phở A", "P1")], [None, place("Bún B", "P2")]]]
+    rows = parsing.extract_rows_from_body(")]}'\n" + json.dumps(obj, ensure_ascii=False), "phở")
+    assert [(r["Tên"], r["Place ID"]) for r in rows] == [("Phở A", "P1"), ("Bún B", "P2")]
+    assert rows[0]["Trang web"] == "https://pho-a.vn/" and rows[0]["Danh mục"] == "Nhà hàng"
+    assert rows[0]["Điện thoại"] == "028 1234 5678" and rows[1]["Trang web"] == ""
+    assert (rows[0]["Vĩ độ"], rows[0]["Kinh độ"]) == (10.77, 106.7)
+
+def test_place_record_fallbacks():
+    rec = place("Cafe C", None, "https://maps.google.com/cafe-c", address=None)
+    rec[2] = ["12 Nguyễn Huệ", "Quận 1", None]
+    row = parsing.place_record_to_row(rec, "cafe")
+    # Không có Place ID -> dùng feature id; website của Google bị bỏ; địa chỉ ghép từ các dòng
+    assert row["Place ID"] == "0x1:0x2" and row["Trang web"] == "" and row["Địa chỉ"] == "12 Nguyễn Huệ, Quận 1"
+    assert parsing.row_key(row) == "0x1:0x2"
+    assert parsing.row_key({"Tên": "X", "Trang web": "https://x.vn/"}) == ("X", "https://x.vn/")
+
+def test_iter_place_records_ignores_lookalikes():
+    bad = [None] * 12
+    bad[9], bad[10], bad[11] = [1, None, 10.0, 106.0], "0x1:0x2", "Không phải"
+    obj = [bad, [[place("Phở A", "P1")]], "chuỗi"]
+    assert [r[11] for r in parsing.iter_place_records(obj)] == ["Phở A"]
+
+def test_extract_rows_from_text_fallback():
+    # JSON hỏng -> quét regex trên text
+    text = ('[null,null,10.5,106.1],"0x1:0x2","Cafe Xanh","https://cafe-xanh.vn/","https://www.google.com/maps/x",'
+            '"Cafe Xanh, 12 Nguyễn Huệ, Quận 1"')
+    rows = parsing.extract_rows_from_body(")]}'\n[" + text, "cafe")
+    assert len(rows) == 1
+    assert rows[0]["Tên"] == "Cafe Xanh" and rows[0]["Trang web"] == "https://cafe-xanh.vn/"
+    assert (rows[0]["Vĩ độ"], rows[0]["Kinh độ"]) == (10.5, 106.1)
+
+def test_extract_rows_from_text():
+    text = ('[null,null,10.5,106.1],"0x1:0x2","Cafe Xanh","https://cafe-xanh.vn/","https://www.google.com/maps/x",'
+            '"Cafe Xanh, 12 Nguyễn Huệ, Quận 1",[null,null,10.6,106.2],"0x3:0x4","Cafe Xanh",'
+            '[null,null,10.7,106.3],"0x5:0x6","Bún Bò"')
+    rows = parsing.extract_rows_from_text(text, "cafe")
+    assert [r["Tên"] for r in rows] == ["Cafe Xanh", "Bún Bò"]
+    assert rows[0]["Trang web"] == "https://cafe-xanh.vn/" and rows[0]["Địa chỉ"] == "Cafe Xanh, 12 Nguyễn Huệ, Quận 1"
+    assert rows[0]["Từ khóa"] == "cafe" and rows[0]["Trạng thái"] == "Chưa lấy"
+    assert rows[1]["Địa chỉ"] == ""
+
+def test_payload_index_window_and_preference():
+    filler = '"' + "x" * 50 + '",'
+    text = ('"https://far.example/",' + filler * 400 + '"https://other.example/?q=1","Tiệm Hoa Mai",'
+            '"https://hoamai.vn/","Tiệm Hoa Mai, 5 Hai Bà Trưng"')
+    idx = parsing.PayloadIndex(text)
+    pos = text.index("Tiệm Hoa Mai")
+    assert idx.address_for("Tiệm Hoa Mai") == "Tiệm Hoa Mai, 5 Hai Bà Trưng"
+    assert idx.address_for("Không có") == ""
+    # URL ngoài cửa sổ bị bỏ qua; URL chứa token của tên và không có query được ưu tiên
+    assert idx.website_near("Tiệm Hoa Mai", pos, window=200) == "https://hoamai.vn/"
+    assert idx.website_near("Tiệm Hoa Mai", pos, window=10) == ""
+    assert parsing.PayloadIndex('"Tiệm, A" "https://maps.google.com/x"').website_near("Tiệm", 1) == ""
+
+def test_payload_index_first_address_wins():
+    idx = parsing.PayloadIndex('"Phở A, 1 Lê Lợi" "Phở A, 2 Hàm Nghi" "Phở A, B, 3 Pasteur"')
+    assert idx.address_for("Phở A") == "Phở A, 1 Lê Lợi"
+    assert idx.address_for("Phở A, B") == "Phở A, B, 3 Pasteur"
+
+# --- Email ---
+def cf_encode(email, key=0x42):
+    return f"{key:02x}" + "".join(f"{ord(ch) ^ key:02x}" for ch in email)
+
+def test_decode_cfemail():
+    assert parsing.decode_cfemail(cf_encode("info@firma.de")) == "info@firma.de"
+    assert parsing.decode_cfemail("zz") == ""
+
+@pytest.mark.parametrize("html, expected", [
+    ("Mail: info@firma.de, Tel. 030 1234", ["info@firma.de"]),
+    ("info&#64;firma&#46;de", ["info@firma.de"]),
+    ("kontakt [at] firma [dot] de", ["kontakt@firma.de"]),
+    ("kontakt (at) firma.de", ["kontakt@firma.de"]),
+    ('<a href="/cdn-cgi/l/email-protection#' + cf_encode("a@b.de") + '">x</a>', ["a@b.de"]),
+    ('<span data-cfemail="' + cf_encode("c@d.de") + '"></span>', ["c@d.de"]),
+    ("user@localhost và @twitter", []),
+])
+def test_extract_obfuscated_emails(html, expected):
+    assert parsing.extract_emails_from_html(html) == expected
+
+def test_mailto_multiple_recipients():
+    html = ('<a href="mailto:a@x.de,b@x.de?subject=Hallo">x</a>'
+            '<a href="MAILTO:c@y.de;d@y.de">y</a><a href="mailto:e%40z.de%2Cf@z.de">z</a>')
+    assert parsing.extract_emails_from_html(html) == ["a@x.de", "b@x.de", "c@y.de", "d@y.de", "e@z.de", "f@z.de"]
+
+def test_blocklist_and_order():
+    html = "Zoe@firma.de info@firma.de noreply@firma.de logo@2x.png info@firma.de"
+    assert parsing.extract_emails_from_html(html, ["noreply", ".png"]) == ["info@firma.de", "Zoe@firma.de"]
+
+# --- Link liên hệ ---
+def test_pick_contact_links_rank_and_order():
+    html = ('<a href="/blog">Blog</a><a href="/team">Impressum</a><a href="/kontakt">Schreiben Sie uns</a>'
+            '<a href="/impressum">Info</a><a href="mailto:x@y.de">Kontakt</a><a href="#kontakt">Kontakt</a>')
+    links = parsing.pick_contact_links_from_html("https://x.de/", html, ["impressum", "kontakt"], limit=3)
+    # Hạng của từ gợi ý trước; cùng hạng thì khớp ở URL trước khớp ở text, rồi tới thứ tự trong trang
+    assert links == ["https://x.de/impressum", "https://x.de/team", "https://x.de/kontakt"]
+
+def test_pick_contact_links_markup_edge_cases():
+    html = ('<a data-href="/impressum" href="/about">Über uns</A><p>Impressum</p>'
+            '<a onclick="if (a > b) go()" href="/legal">Impressum</a>'
+            "<A HREF='/Kontakt.html'>hier</A ><a href=\"/kontakt.html?x=1&amp;y=2\">x</a>")
+    links = parsing.pick_contact_links_from_html("https://x.de/sub/", html, ["impressum", "kontakt"])
+    # data-href không tính; text của link /about dừng ở </A>; '>' trong onclick không cắt thẻ; thực thể HTML được giải mã
+    assert links == ["https://x.de/legal", "https://x.de/Kontakt.html", "https://x.de/kontakt.html?x=1&y=2"]
+
+def test_pick_contact_links_dedup_and_no_hints():
+    html = '<a href="kontakt">Kontakt</a><a href="/sub/kontakt">Kontakt</a>'
+    assert parsing.pick_contact_links_from_html("https://x.de/sub/", html, ["kontakt"]) == ["https://x.de/sub/kontakt"]
+    assert parsing.pick_contact_links_from_html("https://x.de/", html, []) == []
+
+STATIC_PAGE = "<html><body><h1>Công ty A</h1><p>" + "Chúng tôi chuyên cung cấp dịch vụ. " * 20 + "</p></body></html>"
+
+@pytest.mark.parametrize("html, reason", [
+    ("", "trang rỗng"),
+    ('<html><body><div id="root"></div><script src="/app.js"></script></body></html>', "khung ứng dụng JavaScript"),
+    ("<html><body><noscript>You need to enable JavaScript to run this app.</noscript>" + "x " * 300 + "</body></html>", "khung ứng dụng JavaScript"),
+    ("<html><body><p>Xin chào</p>" + "<script>var a = 1;</script>" * 3 + "</body></html>", "gần như không có nội dung tĩnh (nhiều script)"),
+])
+def test_classify_escalation_needs_render(html, reason):
+    assert parsing.classify_escalation([html]) == (True, reason)
+
+def test_classify_escalation_static_pages():
+    assert parsing.classify_escalation([STATIC_PAGE]) == (False, "trang tĩnh không có email")
+    form = STATIC_PAGE.replace("</body>", '<form action="/send"><input type="email" name="from"></form></body>')
+    assert parsing.classify_escalation([STATIC_PAGE, form]) == (False, "chỉ có form liên hệ, không có địa chỉ email")
+
+def test_visible_text_ignores_scripts_and_styles():
+    assert parsing.visible_text_length("<style>p{}</style><p>a  b</p><script>long_code()</script>") == 3
@@ -0,0 +1,67 @@
+import pytest
+
+from task_queue import TaskQueue
+
+@pytest.fixture
+def queue(tmp_path):
+    q = TaskQueue(str(tmp_path / "queue.sqlite3"))
+    yield q
+    q.close()
+
+def expire(q, task_id):
+    q._db.execute("UPDATE queue SET lease_until = 0 WHERE id = ?", (task_id,)); q._db.commit()
+
+def test_lease_complete(queue):
+    assert queue.put_many("j1", "email", [("domain:a", {"sites": [[0, "a.de"]]}), ("domain:b", {})]) == 2
+    tasks = queue.lease("w1", ["email"], n=5)
+    assert [t["key"] for t in tasks] == ["domain:a", "domain:b"]
+    assert tasks[0]["payload"] == {"sites": [[0, "a.de"]]} and tasks[0]["attempt"] == 1
+    assert queue.lease("w2", ["email"], n=5) == []
+    assert queue.lease("w2", ["harvest"], n=5) == []
+    assert queue.complete(tasks[0]["id"], tasks[0]["token"]) == ("j1", "domain:a")
+    assert queue.outstanding("j1") == 1
+    assert queue.workers() == [("w1", 1)]
+
+def test_expired_lease_is_reassigned_and_old_token_rejected(queue):
+    queue.put_many("j1", "harvest", [("q", {})], max_attempts=3)
+    first = queue.lease("w1", ["harvest"])[0]
+    assert queue.heartbeat(first["id"], first["token"])
+    expire(queue, first["id"])
+    second = queue.lease("w2", ["harvest"])[0]
+    assert second["id"] == first["id"] and second["attempt"] == 2
+    # Worker cũ mất lease: kết quả bị bỏ qua
+    assert not queue.heartbeat(first["id"], first["token"])
+    assert queue.complete(first["id"], first["token"]) is None
+    assert queue.complete(second["id"], second["token"]) == ("j1", "q")
+
+def test_fail_retries_then_gives_up(queue):
+    queue.put_many("j1", "email", [("domain:a", {"x": 1})], max_attempts=2)
+    t = queue.lease("w", ["email"])[0]
+    assert queue.fail(t["id"], t["token"], "lỗi", backoff=0) == ("j1", "domain:a", {"x": 1}, "queued")
+    t = queue.lease("w", ["email"])[0]
+    assert queue.fail(t["id"], t["token"], "lỗi", backoff=0)[3] == "failed"
+    assert queue.lease("w", ["email"]) == [] and queue.counts("j1") == {"failed": 1}
+
+def test_expire_leases_marks_exhausted_tasks_failed(queue):
+    queue.put_many("j1", "email", [("domain:a", {})], max_attempts=1)
+    t = queue.lease("w", ["email"])[0]
+    expire(queue, t["id"])
+    assert queue.lease("w", ["email"]) == []
+    assert queue.expire_leases() == [("j1", "domain:a", {})]
+    assert queue.counts("j1") == {"failed": 1}
+
+def test_same_key_of_another_job_waits_for_running_lease(queue):
+    queue.put_many("j1", "email", [("domain:a", {})])
+    queue.put_many("j2", "email", [("domain:a", {}), ("domain:b", {})])
+    tasks = queue.lease("w", ["email"], n=5)
+    assert [(t["job_id"], t["key"]) for t in tasks] == [("j1", "domain:a"), ("j2", "domain:b")]
+    queue.complete(tasks[0]["id"], tasks[0]["token"])
+    assert [(t["job_id"], t["key"]) for t in queue.lease("w", ["email"], n=5)] == [("j2", "domain:a")]
+
+def test_put_many_requeues_unfinished_but_not_done(queue):
+    queue.put_many("j1", "email", [("domain:a", {}), ("domain:b", {})])
+    a, b = queue.lease("w", ["email"], n=2)
+    queue.complete(a["id"], a["token"])
+    assert queue.put_many("j1", "email", [("domain:a", {}), ("domain:b", {"v": 2})]) == 1
+    again = queue.lease("w2", ["email"], n=5)
+    assert [(t["key"], t["payload"], t["attempt"]) for t in again] == [("domain:b", {"v": 2}, 1)]
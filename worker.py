@@ -0,0 +1,196 @@
+# worker.py
+"""Worker phân tán: nhận việc harvest / lấy email từ app qua HTTP, chạy bằng crawler_logic rồi gửi kết quả về.
+
+    python worker.py --server http://192.168.1.10:5000 --token BI_MAT
+    python worker.py --server http://192.168.1.10:5000 --kinds email --email-slots 8
+
+Cấu hình crawl (hints, blocklist, headless, delay...) lấy từ app mỗi lần nhận việc. Mỗi việc có lease:
+worker gia hạn định kỳ; nếu worker chết, việc được giao cho worker khác sau khi lease hết hạn.
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import crawler_logic as crawler
+import metrics
+
+class LeaseLost(Exception):
+    """App không còn nhận kết quả của việc này (lease hết hạn và đã giao cho worker khác)."""
+
+class ApiClient:
+    def __init__(self, server: str, token: str, name: str):
+        self.base, self.name = server.rstrip("/"), name
+        self._session = requests.Session()
+        if token: self._session.headers["X-Worker-Token"] = token
+
+    def post(self, path: str, payload: dict, timeout: int = 60, tries: int = 5) -> dict:
+        """POST JSON; thử lại khi mất kết nối tới app (app khởi động lại...). 409 -> LeaseLost."""
+        payload = dict(payload, worker=self.name)
+        for attempt in range(tries):
+            try:
+                r = self._session.post(self.base + path, json=payload, timeout=timeout)
+            except requests.RequestException:
+                if attempt == tries - 1: raise
+                time.sleep(min(30, 2 ** attempt)); continue
+            if r.status_code == 409: raise LeaseLost(path)
+            r.raise_for_status()
+            return r.json()
+
+class Task:
+    def __init__(self, d: dict):
+        self.id, self.token, self.kind, self.key = d["id"], d["token"], d["kind"], d["key"]
+        self.payload, self.attempt = d["payload"], d["attempt"]
+        self.lost = False
+        self._logs, self._lock = [], threading.Lock()
+
+    def log(self, msg: str):
+        with self._lock: self._logs.append(msg)
+
+    def take_logs(self) -> list:
+        with self._lock:
+            logs, self._logs = self._logs, []
+        return logs
+
+class Worker:
+    ROW_BATCH = 25       # gửi dòng harvest theo lô
+    ROW_INTERVAL = 3.0   # hoặc sau mỗi chừng này giây
+
+    def __init__(self, api: ApiClient, kinds: list, harvest_slots: int, email_slots: int, cache_path: str = None, poll: float = 3.0):
+        self.api, self.kinds, self.poll = api, kinds, poll
+        self.slots = {"harvest": harvest_slots, "email": email_slots}
+        self.inflight = {}  # task id -> Task
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.cfg, self.lease_seconds = None, 300
+        self.cache_path, self.cache = cache_path, None
+        self.pools = {}
+        self.executors = {k: ThreadPoolExecutor(max_workers=max(1, n), thread_name_prefix=k) for k, n in self.slots.items() if k in kinds}
+
+    def log(self, msg: str):
+        print(f"{time.strftime('%H:%M:%S')} {msg}", flush=True)
+
+    # --- cấu hình & tài nguyên ---
+    def apply_config(self, cfg: dict):
+        if self.cfg is None or any(self.cfg.get(k) != cfg.get(k) for k in ("http_max_total", "http_max_per_host", "http_host_delay", "http_retries", "respect_robots")):
+            crawler.HTTP.configure(cfg['http_max_total'], cfg['http_max_per_host'], cfg['http_host_delay'], cfg['http_retries'], cfg['respect_robots'])
+        # Thời hạn cache theo cấu hình của app (đổi TTL không cần mở lại file cache)
+        with self._lock:
+            if self.cache is None:
+                self.cache = crawler.DomainCache(self.cache_path, cfg['cache_ttl_hours'], cfg['cache_negative_ttl_hours'])
+            else: self.cache.ttl, self.cache.negative_ttl = cfg['cache_ttl_hours'] * 3600, cfg['cache_negative_ttl_hours'] * 3600
+        self.cfg = cfg
+
+    def pool(self, kind: str) -> crawler.DriverPool:
+        with self._lock:
+            p = self.pools.get(kind)
+            if p is None:
+                cfg = self.cfg
+                if kind == "harvest":
+                    p = crawler.DriverPool(self.slots["harvest"], headless=cfg['headless'], max_uses=cfg['driver_max_uses'], log_callback=self.log,
+                                           clear_state=False, name="harvest")
+                else:
+                    p = crawler.DriverPool(cfg['selenium_workers'], headless=cfg['headless'], max_uses=cfg['driver_max_uses'], log_callback=self.log,
+                                           block_resources=cfg['selenium_block_resources'])
+                self.pools[kind] = p
+            return p
+
+    # --- vòng lặp chính ---
+    def run(self):
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+        self.log(f"Worker {self.api.name} bắt đầu nhận việc {', '.join(self.kinds)} từ {self.api.base}")
+        try:
+            while not self._stop.is_set():
+                got = 0
+                for kind in self.executors:
+                    with self._lock: free = self.slots[kind] - sum(1 for t in self.inflight.values() if t.kind == kind)
+                    if free <= 0: continue
+                    try: resp = self.api.post("/api/worker/lease", {"kinds": [kind], "n": free})
+                    except Exception as e:
+                        self.log(f"⚠️ Không lấy được việc: {e}"); break
+                    self.apply_config(resp["config"]); self.lease_seconds = resp.get("lease_seconds", self.lease_seconds)
+                    for d in resp["tasks"]:
+                        task = Task(d)
+                        with self._lock: self.inflight[task.id] = task
+                        self.executors[kind].submit(self._run_task, task); got += 1
+                self._stop.wait(0.5 if got else self.poll)
+        except KeyboardInterrupt:
+            self.log("Đang dừng: chờ các việc đang chạy xong (Ctrl+C lần nữa để thoát ngay)...")
+        finally:
+            self._stop.set()
+            for ex in self.executors.values(): ex.shutdown(wait=True)
+            for p in self.pools.values(): p.close()
+            if self.cache: self.cache.close()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(max(5.0, self.lease_seconds / 3)):
+            with self._lock: tasks = list(self.inflight.values())
+            for t in tasks:
+                try: self.api.post(f"/api/worker/tasks/{t.id}/heartbeat", {"token": t.token, "logs": t.take_logs()}, tries=2)
+                except LeaseLost:
+                    t.lost = True; self.log(f"⚠️ Mất lease việc {t.key}, bỏ kết quả.")
+                except Exception as e: self.log(f"⚠️ Heartbeat lỗi ({t.key}): {e}")
+
+    def _run_task(self, task: Task):
+        self.log(f"▶️ {task.kind} {task.key} (lần {task.attempt})")
+        reg = metrics.Registry()
+        try:
+            with metrics.bind(reg):
+                result = self.run_harvest(task) if task.kind == "harvest" else self.run_email(task)
+            if task.lost: raise LeaseLost(task.key)
+            self.api.post(f"/api/worker/tasks/{task.id}/complete", dict(result, token=task.token, logs=task.take_logs(), metrics=reg.snapshot()))
+            self.log(f"✅ Xong {task.key}")
+        except LeaseLost:
+            self.log(f"⚠️ Việc {task.key} đã được giao cho worker khác.")
+        except Exception as e:
+            # Lỗi tạm thời (mạng, 5xx) thì cho thử lại; lỗi khác cũng thử lại vì có thể do Chrome/máy này
+            self.log(f"❌ Lỗi {task.key}: {e}")
+            try: self.api.post(f"/api/worker/tasks/{task.id}/fail", {"token": task.token, "error": str(e), "retry": True,
+                                                                     "logs": task.take_logs(), "metrics": reg.snapshot()})
+            except Exception as e2: self.log(f"⚠️ Không báo lỗi được cho app: {e2}")
+        finally:
+            with self._lock: self.inflight.pop(task.id, None)
+
+    def run_harvest(self, task: Task) -> dict:
+        """Harvest một truy vấn bằng Chrome của worker; dòng được gửi dần về app theo lô."""
+        cfg, p = self.cfg, task.payload
+        batch, last_sent, n = [], time.monotonic(), 0
+        with self.pool("harvest").driver() as driver:
+            for row in crawler.iter_harvest_rows(driver, p["main_kw"], p["sub_kw"], cfg['max_scroll'], cfg['delay'], task.log):
+                if task.lost: raise LeaseLost(task.key)
+                batch.append(row); n += 1
+                if len(batch) >= self.ROW_BATCH or time.monotonic() - last_sent > self.ROW_INTERVAL:
+                    self.api.post(f"/api/worker/tasks/{task.id}/rows", {"token": task.token, "rows": batch, "logs": task.take_logs()})
+                    batch, last_sent = [], time.monotonic()
+        task.log(f"✅ Trích xuất được {n} mục.")
+        return {"rows": batch}
+
+    def run_email(self, task: Task) -> dict:
+        """Lấy email cho mọi dòng của một domain; lỗi tạm thời làm cả việc được giao lại sau."""
+        updates = {}
+        for idx, url in task.payload["sites"]:
+            if task.lost: raise LeaseLost(task.key)
+            updates[str(idx)] = crawler.crawl_site_emails(url, self.cfg, self.cache, self.pool("email"), task.log)
+        return {"updates": updates}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Worker phân tán cho crawlemail.")
+    ap.add_argument("--server", required=True, help="địa chỉ app, ví dụ http://192.168.1.10:5000")
+    ap.add_argument("--token", default=os.environ.get("CRAWL_WORKER_TOKEN", ""), help="worker_token cấu hình trong app")
+    ap.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}")
+    ap.add_argument("--kinds", default="harvest,email", help="loại việc nhận: harvest, email")
+    ap.add_argument("--harvest-slots", type=int, default=1, help="số truy vấn Maps chạy song song (mỗi truy vấn 1 Chrome)")
+    ap.add_argument("--email-slots", type=int, default=4, help="số domain lấy email song song")
+    ap.add_argument("--cache", help="file DomainCache của worker (mặc định domain_cache.sqlite3)")
+    args = ap.parse_args(argv)
+    if not args.token: ap.error("cần --token (hoặc biến môi trường CRAWL_WORKER_TOKEN) khớp worker_token của app")
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip() in ("harvest", "email")]
+    if not kinds: ap.error("--kinds phải gồm harvest và/hoặc email")
+    Worker(ApiClient(args.server, args.token, args.name), kinds, args.harvest_slots, args.email_slots, args.cache).run()
+
+if __name__ == "__main__":
+    main()